@@ -0,0 +1,245 @@
+import logging
+import threading
+from datetime import datetime
+from typing import NamedTuple
+
+from sqlalchemy import bindparam, text, update
+from sqlmodel import Session, func, select
+
+from database import engine
+from model import PoolAccount, User
+from utils import get_accounts
+
+logger = logging.getLogger(__name__)
+
+# Claims the first free account in one statement, so concurrent requests (and
+# workers sharing the database) can never receive the same address
+ALLOCATE_SQL = text(
+    """
+    UPDATE poolaccount
+    SET user_id = :user_id, allocated_at = :now
+    WHERE address = (
+        SELECT address FROM poolaccount
+        WHERE user_id IS NULL
+        ORDER BY position
+        LIMIT 1
+    )
+    RETURNING address, private_key
+    """
+)
+
+
+class AccountKeys(NamedTuple):
+    address: str  # checksum address
+    public_key: str  # 0x-prefixed uncompressed secp256k1 key, as str(PublicKey)
+
+
+def derive_keys(private_key: str) -> AccountKeys:
+    from eth_keys import keys
+    from eth_utils import decode_hex
+
+    public_key = keys.PrivateKey(decode_hex(private_key)).public_key
+    return AccountKeys(public_key.to_checksum_address(), str(public_key))
+
+
+class AccountPool:
+    """
+    Blockchain accounts from accounts.json kept in the `poolaccount` table with
+    their allocation state. Allocation and release are single indexed statements
+    instead of a scan over every account and every user.
+
+    The public key and checksum address of every account are derived once
+    (by precompute_keys() during warm-up, or on first use) and kept in memory,
+    so assigning an account does no elliptic-curve math.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = {}  # address -> AccountKeys
+        self.allocations = 0
+        self.releases = 0
+        self.exhausted = 0  # allocation requests that found no free account
+
+    def load(self, session: Session, accounts=None):
+        """
+        Add accounts.json entries missing from the table. Accounts already held by
+        a user (from before the pool existed) are marked as allocated to them.
+        Returns the number of new accounts.
+        """
+        accounts = get_accounts() if accounts is None else accounts
+        known = set(session.exec(select(PoolAccount.address)).all())
+        owners = {
+            address: user_id
+            for user_id, address in session.exec(
+                select(User.id, User.blockchain_address).where(
+                    User.blockchain_address != None
+                )
+            ).all()
+        }
+
+        added = 0
+        for position, account in enumerate(accounts):
+            address = account["account"]
+            if address in known:
+                continue
+            user_id = owners.get(address)
+            session.add(
+                PoolAccount(
+                    address=address,
+                    private_key=account["privateKey"],
+                    position=position,
+                    user_id=user_id,
+                    allocated_at=datetime.utcnow() if user_id else None,
+                )
+            )
+            added += 1
+        session.commit()
+        return added
+
+    def precompute_keys(self, session: Session) -> int:
+        """
+        Derive the keys of every pool account now instead of on first use.
+        """
+        rows = session.exec(select(PoolAccount.address, PoolAccount.private_key)).all()
+        for address, private_key in rows:
+            if address not in self._keys:
+                self._keys[address] = derive_keys(private_key)
+        logger.debug("Derived keys of %d pool accounts", len(rows))
+        return len(rows)
+
+    def keys(self, account: PoolAccount) -> AccountKeys:
+        """
+        Public key and checksum address of a pool account, memoized.
+        """
+        account_keys = self._keys.get(account.address)
+        if account_keys is None:
+            account_keys = derive_keys(account.private_key)
+            self._keys[account.address] = account_keys
+        return account_keys
+
+    def get_allocation(self, session: Session, user_id: int):
+        return session.exec(
+            select(PoolAccount).where(PoolAccount.user_id == user_id)
+        ).first()
+
+    def allocate(self, session: Session, user_id: int):
+        """
+        Return the account held by `user_id`, claiming a free one if it has none.
+        Runs inside the caller's transaction; returns None when the pool is empty.
+        """
+        account = self.get_allocation(session, user_id)
+        if account:
+            return account
+
+        row = session.execute(
+            ALLOCATE_SQL, {"user_id": user_id, "now": datetime.utcnow()}
+        ).first()
+        with self._lock:
+            if row is None:
+                self.exhausted += 1
+                return None
+            self.allocations += 1
+        return session.get(PoolAccount, row.address)
+
+    def claim(self, user_id: int):
+        """
+        allocate() in a short transaction of its own, committed before it
+        returns, for callers that go on to wait on the node: holding the write
+        lock across an RPC would block every other writer. Returns (account,
+        whether it was free until now).
+        """
+        with Session(engine, expire_on_commit=False) as session:
+            held = self.get_allocation(session, user_id)
+            account = held or self.allocate(session, user_id)
+            session.commit()
+            return account, account is not None and held is None
+
+    def unclaim(self, user_id: int):
+        """
+        release() in a transaction of its own, for a caller that failed after
+        claim() took a free account.
+        """
+        with Session(engine) as session:
+            account = self.release(session, user_id)
+            session.commit()
+            return account
+
+    def allocate_many(self, session: Session, user_ids: list) -> dict:
+        """
+        Claim one free account for each of `user_ids` (users holding none, e.g.
+        just imported) with one read and one bulk update, instead of a statement
+        per user. Returns {user_id: account row}; users left out of it found the
+        pool empty.
+
+        Runs inside the caller's transaction, which must already have written so
+        it holds SQLite's write lock and no other writer can claim the same free
+        rows in between. Should that not hold the claim raises and the caller's
+        transaction has to be rolled back.
+        """
+        if not user_ids:
+            return {}
+        rows = session.exec(
+            select(PoolAccount.address, PoolAccount.private_key)
+            .where(PoolAccount.user_id == None)
+            .order_by(PoolAccount.position)
+            .limit(len(user_ids))
+        ).all()
+        claimed = dict(zip(user_ids, rows))
+        if claimed:
+            # A Core executemany: the ORM would treat a list of parameters as a
+            # bulk update by primary key, which cannot carry the extra WHERE
+            result = session.connection().execute(
+                update(PoolAccount)
+                .where(
+                    PoolAccount.address == bindparam("claim_address"),
+                    PoolAccount.user_id == None,
+                )
+                .values(
+                    user_id=bindparam("claim_user_id"), allocated_at=datetime.utcnow()
+                ),
+                [
+                    {"claim_address": row.address, "claim_user_id": user_id}
+                    for user_id, row in claimed.items()
+                ],
+            )
+            if result.rowcount != len(claimed):
+                raise RuntimeError("Pool accounts were claimed concurrently")
+        with self._lock:
+            self.allocations += len(claimed)
+            self.exhausted += len(user_ids) - len(claimed)
+        return claimed
+
+    def release(self, session: Session, user_id: int):
+        """
+        Return the account held by `user_id` to the pool (in the caller's
+        transaction).
+        """
+        account = self.get_allocation(session, user_id)
+        if not account:
+            return None
+        account.user_id = None
+        account.allocated_at = None
+        session.add(account)
+        with self._lock:
+            self.releases += 1
+        return account
+
+    def stats(self, session: Session):
+        total = session.exec(select(func.count()).select_from(PoolAccount)).one()
+        free = session.exec(
+            select(func.count())
+            .select_from(PoolAccount)
+            .where(PoolAccount.user_id == None)
+        ).one()
+        return {
+            "total": total,
+            "allocated": total - free,
+            "free": free,
+            "utilization": (total - free) / total if total else 0.0,
+            "allocations": self.allocations,
+            "releases": self.releases,
+            "exhausted": self.exhausted,
+        }
+
+
+account_pool = AccountPool()
@@ -0,0 +1,247 @@
+import asyncio
+import logging
+import os
+
+from metrics import async_rpc_metrics_middleware, observe_rpc
+from utils import RPC_TIMEOUT, RPC_URL, ContractRegistry, did_cache
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait for a transaction to be mined
+RECEIPT_TIMEOUT = float(os.getenv("CONNECTOR_RECEIPT_TIMEOUT", "120"))
+# Max eth_calls per JSON-RPC batch request
+DID_BATCH_SIZE = int(os.getenv("CONNECTOR_DID_BATCH_SIZE", "100"))
+# Max batch requests in flight at once per resolve_dids_batch call
+DID_BATCH_CONCURRENCY = int(os.getenv("CONNECTOR_DID_BATCH_CONCURRENCY", "4"))
+# Selector of Error(string), the ABI encoding of a require() message
+ERROR_SELECTOR = "0x08c379a0"
+
+_async_w3 = None
+
+
+def get_async_w3():
+    """
+    The AsyncWeb3 instance used by the async route handlers so chain calls do
+    not block the event loop, built (and web3 imported) on first use.
+    """
+    global _async_w3
+    if _async_w3 is None:
+        from aiohttp import ClientTimeout
+        from web3 import AsyncHTTPProvider, AsyncWeb3
+
+        async_w3 = AsyncWeb3(
+            AsyncHTTPProvider(
+                RPC_URL, request_kwargs={"timeout": ClientTimeout(total=RPC_TIMEOUT)}
+            )
+        )
+        async_w3.middleware_onion.add(async_rpc_metrics_middleware, "metrics")
+        _async_w3 = async_w3
+    return _async_w3
+
+
+def __getattr__(name):
+    if name == "async_w3":
+        return get_async_w3()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+class AsyncContractRegistry(ContractRegistry):
+    def _w3(self):
+        return get_async_w3()
+
+
+async_contract_registry = AsyncContractRegistry()
+async_contract_registry.add_reload_listener(did_cache.clear)
+
+
+def initialize_async_contract():
+    return async_contract_registry.get()
+
+
+async def _wait_for_receipt(tx):
+    return await get_async_w3().eth.wait_for_transaction_receipt(
+        tx, timeout=RECEIPT_TIMEOUT
+    )
+
+
+async def async_get_did(address: str, timeout: float = RPC_TIMEOUT):
+    """
+    Async version of utils.get_did, sharing the same DID cache.
+    Raises ContractLogicError if the address has no DID.
+    """
+    did = did_cache.get(address.lower())
+    if did is not None:
+        return did
+
+    contract = initialize_async_contract()
+    did = await asyncio.wait_for(
+        contract.functions.getDID(address).call(), timeout=timeout
+    )
+    logger.debug("Retrieved DID from blockchain: %s", did)
+    did_cache.set(address.lower(), did)
+    return did
+
+
+async def async_register_did(address: str, did: str):
+    """
+    Async version of utils.register_did.
+    """
+    contract = initialize_async_contract()
+    tx = await contract.functions.registerDID(address, did).transact({"from": address})
+    receipt = await _wait_for_receipt(tx)
+    did_cache.invalidate(address.lower())
+    return receipt
+
+
+async def async_revoke_did(address: str):
+    """
+    Async version of utils.revoke_did.
+    """
+    contract = initialize_async_contract()
+    tx = await contract.functions.revokeDID(address).transact({"from": address})
+    receipt = await _wait_for_receipt(tx)
+    did_cache.invalidate(address.lower())
+    return receipt
+
+
+async def async_issue_vc(issuer: str, holder: str, credential_hash: str):
+    """
+    Async version of utils.issue_vc.
+    """
+    contract = initialize_async_contract()
+    tx = await contract.functions.issueVC(holder, credential_hash).transact(
+        {"from": issuer}
+    )
+    return await _wait_for_receipt(tx)
+
+
+def is_address(address: str) -> bool:
+    # Pure format/checksum check, no RPC involved
+    from eth_utils import is_address as _is_address
+
+    return _is_address(address)
+
+
+_batch_session = None
+
+
+async def _get_batch_session():
+    import aiohttp
+
+    global _batch_session
+    if _batch_session is None or _batch_session.closed:
+        _batch_session = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=RPC_TIMEOUT)
+        )
+    return _batch_session
+
+
+async def close_batch_session():
+    global _batch_session
+    if _batch_session is not None:
+        await _batch_session.close()
+        _batch_session = None
+
+
+def _decode_rpc_error(error: dict) -> str:
+    from eth_abi import decode
+
+    # Prefer the revert reason (e.g. "DID not found") over the node's message
+    data = error.get("data")
+    if isinstance(data, dict):
+        data = data.get("data")
+    if isinstance(data, str) and data.startswith(ERROR_SELECTOR):
+        try:
+            return decode(["string"], bytes.fromhex(data[10:]))[0]
+        except Exception:
+            pass
+    return error.get("message", "Unknown error")
+
+
+async def _resolve_dids_chunk(contract, addresses):
+    from eth_abi import decode
+
+    payload = [
+        {
+            "jsonrpc": "2.0",
+            "id": i,
+            "method": "eth_call",
+            "params": [
+                {
+                    "to": contract.address,
+                    "data": contract.encodeABI(fn_name="getDID", args=[address]),
+                },
+                "latest",
+            ],
+        }
+        for i, address in enumerate(addresses)
+    ]
+    session = await _get_batch_session()
+    with observe_rpc("eth_call_batch", "getDID"):
+        async with session.post(RPC_URL, json=payload) as response:
+            response.raise_for_status()
+            replies = await response.json(content_type=None)
+
+    # Batch replies may come back in any order
+    results = {}
+    for reply in replies:
+        address = addresses[reply["id"]]
+        if "error" in reply:
+            results[address] = {"did": None, "error": _decode_rpc_error(reply["error"])}
+        else:
+            did = decode(["string"], bytes.fromhex(reply["result"][2:]))[0]
+            did_cache.set(address.lower(), did)
+            results[address] = {"did": did, "error": None}
+    return results
+
+
+async def resolve_dids_batch(addresses, concurrency: int = DID_BATCH_CONCURRENCY):
+    """
+    Resolve many DIDs at once. Cached DIDs are answered locally and the rest are
+    fetched with JSON-RPC batch requests of up to DID_BATCH_SIZE eth_calls, at
+    most `concurrency` of them in flight. Returns one {address, did, error} entry
+    per input address; a revert such as "DID not found" only fails that entry.
+    """
+    results = {}
+    misses = []
+    for address in addresses:
+        if address in results:
+            continue
+        if not is_address(address):
+            results[address] = {"did": None, "error": "Invalid Ethereum address."}
+            continue
+        did = did_cache.get(address.lower())
+        if did is not None:
+            results[address] = {"did": did, "error": None}
+        else:
+            results[address] = None
+            misses.append(address)
+
+    if misses:
+        from eth_utils import to_checksum_address
+
+        contract = initialize_async_contract()
+        chunks = [
+            misses[i : i + DID_BATCH_SIZE]
+            for i in range(0, len(misses), DID_BATCH_SIZE)
+        ]
+        # Large inputs are spread over time instead of hitting the node at once
+        semaphore = asyncio.Semaphore(max(concurrency, 1))
+
+        async def resolve_chunk(chunk):
+            async with semaphore:
+                return await _resolve_dids_chunk(
+                    contract, [to_checksum_address(a) for a in chunk]
+                )
+
+        replies = await asyncio.gather(
+            *(resolve_chunk(chunk) for chunk in chunks), return_exceptions=True
+        )
+        for chunk, reply in zip(chunks, replies):
+            for address in chunk:
+                if isinstance(reply, Exception):
+                    results[address] = {"did": None, "error": str(reply)}
+                else:
+                    results[address] = reply[to_checksum_address(address)]
+
+    return [{"address": address, **results[address]} for address in addresses]
@@ -0,0 +1,141 @@
+"""
+Compare concurrent /api/profile/ throughput with the blocking Web3 path and the
+AsyncWeb3 path, against a local stub JSON-RPC node with a fixed response latency.
+
+Usage (from the Connector directory):
+    python benchmarks/bench_async_profile.py --requests 200 --concurrency 50 --latency 0.05
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from aiohttp import web
+from eth_abi import encode
+
+CONNECTOR_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STUB_PORT = 18545
+
+
+def start_stub_node(latency: float, port: int = STUB_PORT):
+    """
+    Run a minimal JSON-RPC node in a background thread that answers every
+    eth_call with an ABI-encoded DID after `latency` seconds.
+    """
+    did_result = "0x" + encode(["string"], ["did:key:stub"]).hex()
+
+    async def handle(request):
+        payload = await request.json()
+        if payload["method"] == "eth_call":
+            await asyncio.sleep(latency)
+            result = did_result
+        elif payload["method"] == "eth_chainId":
+            result = "0x7a69"
+        else:
+            result = "0x1"
+        return web.json_response(
+            {"jsonrpc": "2.0", "id": payload["id"], "result": result}
+        )
+
+    ready = threading.Event()
+
+    def run():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        app = web.Application()
+        app.router.add_post("/", handle)
+        runner = web.AppRunner(app)
+        loop.run_until_complete(runner.setup())
+        loop.run_until_complete(web.TCPSite(runner, "127.0.0.1", port).start())
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    ready.wait()
+
+
+async def run_scenario(main, use_async: bool, requests: int, concurrency: int):
+    import httpx
+
+    main.USE_ASYNC_WEB3 = use_async
+    transport = httpx.ASGITransport(app=main.app)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+
+        async def one(i):
+            async with semaphore:
+                response = await client.post(
+                    "/api/profile/", json={"token": f"token-{i % 10}"}
+                )
+                response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "mode": "async" if use_async else "sync",
+        "seconds": elapsed,
+        "req_per_s": requests / elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    # Point the connector at the stub node and a throwaway database, with the DID
+    # cache disabled so every request hits the node
+    os.environ["CONNECTOR_RPC_URL"] = f"http://127.0.0.1:{STUB_PORT}"
+    os.environ["CONNECTOR_DID_CACHE_SIZE"] = "0"
+    os.environ["CONNECTOR_DID_EVENT_POLL_INTERVAL"] = "0"
+    sys.path.insert(0, CONNECTOR_DIR)
+    os.chdir(tempfile.mkdtemp())
+
+    start_stub_node(args.latency)
+
+    import main as connector
+    from sqlmodel import Session
+
+    from model import User
+
+    connector.run_migrations()
+    with Session(connector.engine) as session:
+        for i in range(10):
+            session.add(
+                User(
+                    username=f"user{i}",
+                    email=f"user{i}@user.com",
+                    phone="0",
+                    password_hash="x",
+                    role="user",
+                    blockchain_address="0x70997970C51812dc3A010C7d01b50e0d17dc79C8",
+                    access_token=f"token-{i}",
+                    isPWLess=True,
+                    isOnline=False,
+                )
+            )
+        session.commit()
+
+    for use_async in (False, True):
+        result = asyncio.run(
+            run_scenario(connector, use_async, args.requests, args.concurrency)
+        )
+        print(
+            f"{result['mode']:>5}: {args.requests} requests in "
+            f"{result['seconds']:.2f}s -> {result['req_per_s']:.1f} req/s"
+        )
+
+
+if __name__ == "__main__":
+    main()
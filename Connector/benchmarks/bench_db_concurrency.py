@@ -0,0 +1,167 @@
+"""
+Compare concurrent read/write throughput of the database modes used by the
+route handlers:
+
+  legacy  sync engine with SQLite defaults (rollback journal), queries run
+          directly on the event loop like the handlers used to
+  sync    the tuned sync engine (WAL, pragmas, bounded pool) through run_db,
+          i.e. the default CONNECTOR_DATABASE_ASYNC=0 mode
+  async   aiosqlite engine with the same tuning, CONNECTOR_DATABASE_ASYNC=1
+
+Readers look users up by email while writers flip isOnline, all as coroutines
+on one event loop, for a fixed duration per mode. A ticker coroutine measures
+how late the loop wakes it ("loop lag"): that is the delay every other request
+(RPC calls, health checks, ...) sees while the database work is running.
+
+Usage (from the Connector directory):
+    python benchmarks/bench_db_concurrency.py --users 10000 --readers 32 --writers 4
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+CONNECTOR_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def seed(db_file: str, users: int):
+    from migrations import run_migrations
+    from sqlmodel import create_engine
+
+    run_migrations(create_engine(f"sqlite:///{db_file}"))
+    with sqlite3.connect(db_file) as connection:
+        connection.executemany(
+            'INSERT INTO user (username, email, phone, password_hash, role, "isPWLess", '
+            '"isOnline") VALUES (?, ?, ?, ?, ?, 0, 0)',
+            ((f"user{i}", f"user{i}@user.com", "0", "x", "user") for i in range(users)),
+        )
+
+
+def make_session_factory(mode: str, db_file: str):
+    from sqlalchemy import event
+    from sqlmodel import Session, create_engine
+
+    import database
+
+    if mode == "async":
+        from sqlmodel.ext.asyncio.session import AsyncSession
+
+        engine = database.create_async_sqlite_engine(db_file)
+        return engine, lambda: AsyncSession(engine, expire_on_commit=False)
+
+    url = f"sqlite:///{db_file}"
+    if mode == "legacy":
+        engine = create_engine(url, connect_args=database.connect_args)
+    else:
+        engine = create_engine(
+            url, connect_args=database.connect_args, **database.pool_args()
+        )
+        event.listen(engine, "connect", database.set_sqlite_pragmas)
+    return engine, lambda: Session(engine, expire_on_commit=False)
+
+
+async def run_mode(mode: str, db_file: str, args):
+    from sqlmodel import select, update
+
+    from database import run_db
+    from model import User
+
+    engine, new_session = make_session_factory(mode, db_file)
+
+    def read(session, email):
+        return session.exec(select(User).where(User.email == email)).first()
+
+    def write(session, email, online):
+        session.execute(update(User).where(User.email == email).values(isOnline=online))
+        session.commit()
+
+    async def call(session, fn, *fn_args):
+        if mode == "legacy":
+            return fn(session, *fn_args)
+        return await run_db(session, fn, *fn_args)
+
+    async def worker(fn, latencies, deadline):
+        rng = random.Random()
+        while time.perf_counter() < deadline:
+            email = f"user{rng.randrange(args.users)}@user.com"
+            start = time.perf_counter()
+            if mode == "async":
+                async with new_session() as session:
+                    await call(session, fn, email, *([True] if fn is write else []))
+            else:
+                with new_session() as session:
+                    await call(session, fn, email, *([True] if fn is write else []))
+            latencies.append(time.perf_counter() - start)
+            # Let other coroutines in even when the call never awaited
+            await asyncio.sleep(0)
+
+    async def ticker(lags, deadline, interval=0.005):
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            await asyncio.sleep(interval)
+            lags.append(time.perf_counter() - start - interval)
+
+    reads, writes, lags = [], [], []
+    deadline = time.perf_counter() + args.duration
+    await asyncio.gather(
+        ticker(lags, deadline),
+        *(worker(read, reads, deadline) for _ in range(args.readers)),
+        *(worker(write, writes, deadline) for _ in range(args.writers)),
+    )
+
+    if mode == "async":
+        await engine.dispose()
+    else:
+        engine.dispose()
+
+    def percentile(values, p):
+        return statistics.quantiles(values, n=100)[p - 1] * 1000 if values else 0
+
+    return {
+        "reads/s": len(reads) / args.duration,
+        "writes/s": len(writes) / args.duration,
+        "read p50": percentile(reads, 50),
+        "read p95": percentile(reads, 95),
+        "write p95": percentile(writes, 95),
+        "lag p99": percentile(lags, 99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--readers", type=int, default=32)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=5)
+    parser.add_argument("--modes", nargs="+", default=["legacy", "sync", "async"])
+    args = parser.parse_args()
+
+    os.environ.setdefault(
+        "CONNECTOR_DATABASE_FILE", os.path.join(tempfile.mkdtemp(), "unused.db")
+    )
+    sys.path.insert(0, CONNECTOR_DIR)
+
+    print(
+        f"{'mode':>8} {'reads/s':>9} {'writes/s':>9} "
+        f"{'read p50':>9} {'read p95':>9} {'write p95':>10} {'lag p99':>9}  (ms)"
+    )
+    for mode in args.modes:
+        # Journal mode is stored in the file, so every mode gets its own copy
+        db_file = os.path.join(tempfile.mkdtemp(), f"{mode}.db")
+        seed(db_file, args.users)
+        result = asyncio.run(run_mode(mode, db_file, args))
+        print(
+            f"{mode:>8} {result['reads/s']:>9.0f} {result['writes/s']:>9.0f} "
+            f"{result['read p50']:>9.2f} {result['read p95']:>9.2f} "
+            f"{result['write p95']:>10.2f} {result['lag p99']:>9.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
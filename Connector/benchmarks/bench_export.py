@@ -0,0 +1,141 @@
+"""
+Time the users + DID export against the local chain: the old way (the user list,
+then one getDID call per user) against GET /api/users/export, which resolves the
+DIDs of each chunk in bounded JSON-RPC batches while reading the next one.
+With --memory the peak Python memory of each run is traced too (which slows
+everything down); for the export it should not grow with the number of users.
+
+Usage (from the Connector directory):
+    python benchmarks/bench_export.py --users 500 [--memory]
+"""
+
+import argparse
+import asyncio
+import os
+import secrets
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+CONNECTOR_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def seed_users(db_file: str, start: int, users: int):
+    from eth_utils import to_checksum_address
+
+    with sqlite3.connect(db_file) as connection:
+        connection.executemany(
+            "INSERT INTO user (username, email, phone, password_hash, role, "
+            'blockchain_address, "isPWLess", "isOnline") '
+            "VALUES (?, ?, ?, 'x', 'user', ?, 1, 0)",
+            (
+                (
+                    f"user{i}",
+                    f"user{i}@user.com",
+                    "0",
+                    to_checksum_address("0x" + secrets.token_hex(20)),
+                )
+                for i in range(start, start + users)
+            ),
+        )
+
+
+async def one_by_one(client) -> int:
+    from web3.exceptions import ContractLogicError
+
+    from async_chain import async_get_did
+
+    users, params = [], {"limit": 1000}
+    while params:
+        response = await client.get("/api/users", params=params)
+        users += response.json()
+        cursor = response.headers.get("x-next-cursor")
+        params = {"limit": 1000, "cursor": cursor} if cursor else None
+    for user in users:
+        try:
+            await async_get_did(user["blockchain_address"])
+        except ContractLogicError:
+            pass
+    return len(users)
+
+
+async def export(client) -> int:
+    lines = 0
+    async with client.stream("GET", "/api/users/export") as response:
+        async for line in response.aiter_lines():
+            lines += bool(line)
+    return lines
+
+
+async def run(app, users: int, db_file: str, memory: bool):
+    import httpx
+
+    from async_chain import close_batch_session
+    from utils import did_cache
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench", timeout=None
+    ) as client:
+        print(
+            f"{'method':>12} {'users':>7} {'seconds':>8} {'users/s':>8} {'peak KiB':>9}"
+        )
+        for total, method, call in (
+            (users, "per-user", one_by_one),
+            (users, "export", export),
+            (users * 2, "export", export),
+        ):
+            if total > users:
+                seed_users(db_file, users, total - users)
+            did_cache.clear()
+            if memory:
+                tracemalloc.start()
+            started = time.perf_counter()
+            count = await call(client)
+            elapsed = time.perf_counter() - started
+            peak = tracemalloc.get_traced_memory()[1] / 1024
+            tracemalloc.stop()
+            assert count == total, (count, total)
+            print(
+                f"{method:>12} {total:>7} {elapsed:>8.2f} {total / elapsed:>8.0f} "
+                f"{peak:>9.0f}"
+            )
+    await close_batch_session()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--memory", action="store_true")
+    args = parser.parse_args()
+
+    sys.path.insert(0, CONNECTOR_DIR)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from local_chain import LocalChain
+
+    chain = LocalChain().start()
+    db_file = os.path.join(tempfile.mkdtemp(), "bench.db")
+    os.environ.update(
+        {
+            **chain.environ(),
+            "CONNECTOR_DATABASE_FILE": db_file,
+            "CONNECTOR_LOG_FILE": "",
+            "CONNECTOR_LOG_CONSOLE": "0",
+        }
+    )
+    os.chdir(CONNECTOR_DIR)
+
+    import main as connector
+
+    try:
+        connector.run_migrations()
+        seed_users(db_file, 0, args.users)
+        asyncio.run(run(connector.app, args.users, db_file, args.memory))
+    finally:
+        chain.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Compare importing users with the bulk importer (one email check, one insert
+and one commit per batch) against the per-user path of the register route (a
+lookup, an insert and a commit per user). Passwords are hashed with a low bcrypt
+cost so the database work is what gets measured.
+
+Usage (from the Connector directory):
+    python benchmarks/bench_import.py --users 5000 --batch-size 500
+"""
+
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+
+CONNECTOR_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_ndjson(users: int, prefix: str) -> str:
+    import orjson
+
+    return "".join(
+        orjson.dumps(
+            {
+                "username": f"{prefix}{i}",
+                "email": f"{prefix}{i}@user.com",
+                "phone": "0",
+                "role": "user",
+                "password": "benchmark-password",
+            }
+        ).decode()
+        + "\n"
+        for i in range(users)
+    )
+
+
+def import_one_by_one(text: str):
+    from sqlmodel import Session, select
+
+    from database import engine
+    from model import RegisterRequest, User
+    from passwords import pwd_context
+    from user_import import read_rows
+
+    with Session(engine) as session:
+        for _, fields in read_rows(io.StringIO(text), "ndjson"):
+            request = RegisterRequest.model_validate(fields)
+            if session.exec(select(User).where(User.email == request.email)).first():
+                continue
+            session.add(
+                User(
+                    username=request.username,
+                    email=request.email,
+                    phone=request.phone,
+                    password_hash=pwd_context.hash(request.password),
+                    role=request.role,
+                    isPWLess=False,
+                    isOnline=False,
+                )
+            )
+            session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    os.environ.update(
+        {
+            "CONNECTOR_DATABASE_FILE": os.path.join(tempfile.mkdtemp(), "bench.db"),
+            "CONNECTOR_LOG_FILE": "",
+            "CONNECTOR_LOG_CONSOLE": "0",
+            "CONNECTOR_PASSWORD_HASH_ROUNDS": "4",
+        }
+    )
+    os.chdir(CONNECTOR_DIR)
+    sys.path.insert(0, CONNECTOR_DIR)
+
+    from migrations import run_migrations
+    from user_import import import_users
+
+    run_migrations()
+
+    def bulk(text):
+        import_users(io.StringIO(text), "ndjson", batch_size=args.batch_size)
+
+    print(f"{'method':>12} {'users':>7} {'seconds':>8} {'users/s':>8}")
+    for name, prefix, run in (
+        ("per-user", "single", import_one_by_one),
+        ("bulk", "bulk", bulk),
+        # The same rows again: only the batched email checks run
+        ("bulk, dupes", "bulk", bulk),
+    ):
+        text = make_ndjson(args.users, prefix)
+        started = time.perf_counter()
+        run(text)
+        elapsed = time.perf_counter() - started
+        print(
+            f"{name:>12} {args.users:>7} {elapsed:>8.2f} {args.users / elapsed:>8.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Measure /verify-token (the login presence update) latency as the user table
+grows, to check it stays flat instead of growing with the number of users.
+
+Usage (from the Connector directory):
+    python benchmarks/bench_login.py --sizes 100 1000 10000 100000 --logins 200
+"""
+
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+CONNECTOR_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def grow_users(db_file: str, start: int, stop: int):
+    # Raw executemany keeps seeding 100k rows fast
+    with sqlite3.connect(db_file) as connection:
+        connection.executemany(
+            'INSERT INTO user (username, email, phone, password_hash, role, "isPWLess", '
+            '"isOnline") VALUES (?, ?, ?, ?, ?, 0, ?)',
+            (
+                (f"user{i}", f"user{i}@user.com", "0", "x", "user", i % 10 == 0)
+                for i in range(start, stop)
+            ),
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[100, 1000, 10000, 100000]
+    )
+    parser.add_argument("--logins", type=int, default=200)
+    args = parser.parse_args()
+
+    db_file = os.path.join(tempfile.mkdtemp(), "bench.db")
+    os.environ["CONNECTOR_DATABASE_FILE"] = db_file
+    sys.path.insert(0, CONNECTOR_DIR)
+
+    import main as connector
+    from fastapi.testclient import TestClient
+
+    connector.run_migrations()
+    client = TestClient(connector.app)
+
+    size = 0
+    print(f"{'users':>8} {'p50 ms':>8} {'p95 ms':>8} {'mean ms':>8}")
+    for target in sorted(args.sizes):
+        grow_users(db_file, size, target)
+        size = target
+
+        latencies = []
+        for i in range(args.logins):
+            email = f"user{(i * 7919) % size}@user.com"
+            token = connector.create_access_token(data={"sub": email, "role": "user"})
+            start = time.perf_counter()
+            response = client.post("/verify-token", json={"token": token})
+            latencies.append((time.perf_counter() - start) * 1000)
+            assert response.status_code == 200, response.text
+
+        latencies.sort()
+        print(
+            f"{size:>8} {statistics.median(latencies):>8.2f} "
+            f"{latencies[int(len(latencies) * 0.95) - 1]:>8.2f} "
+            f"{statistics.mean(latencies):>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Measure POST /token (password login) throughput and latency at several bcrypt
+costs and PasswordHasher pool sizes, to pick CONNECTOR_PASSWORD_HASH_ROUNDS
+and CONNECTOR_PASSWORD_WORKERS for a machine.
+
+Usage (from the Connector directory):
+    python benchmarks/bench_passwords.py --rounds 10 11 12 --workers 1 2 4
+"""
+
+import argparse
+import asyncio
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+CONNECTOR_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASSWORD = "benchmark-password"
+
+
+def seed_users(db_file: str, users: int, password_hash: str):
+    with sqlite3.connect(db_file) as connection:
+        connection.execute("DELETE FROM user")
+        connection.executemany(
+            'INSERT INTO user (username, email, phone, password_hash, role, "isPWLess", '
+            '"isOnline") VALUES (?, ?, ?, ?, ?, 0, 0)',
+            (
+                (f"user{i}", f"user{i}@user.com", "0", password_hash, "user")
+                for i in range(users)
+            ),
+        )
+
+
+async def run_logins(app, logins: int, users: int, concurrency: int):
+    import httpx
+
+    latencies = []
+    counter = iter(range(logins))
+
+    async def worker(client):
+        for i in counter:
+            start = time.perf_counter()
+            response = await client.post(
+                "/token",
+                json={"email": f"user{i % users}@user.com", "password": PASSWORD},
+            )
+            latencies.append(time.perf_counter() - start)
+            assert response.status_code == 200, response.text
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return elapsed, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, nargs="+", default=[10, 11, 12])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    db_file = os.path.join(tempfile.mkdtemp(), "bench.db")
+    os.environ["CONNECTOR_DATABASE_FILE"] = db_file
+    os.environ.setdefault("CONNECTOR_LOG_CONSOLE", "0")
+    sys.path.insert(0, CONNECTOR_DIR)
+
+    import main as connector
+    from passwords import PasswordHasher
+
+    connector.run_migrations()
+
+    print(f"{'rounds':>6} {'workers':>7} {'logins/s':>9} {'p50 ms':>8} {'p95 ms':>8}")
+    for rounds in args.rounds:
+        for workers in args.workers:
+            hasher = PasswordHasher(rounds=rounds, workers=workers)
+            # Users already hashed at this cost, so no login triggers a rehash
+            seed_users(db_file, args.users, hasher.context.hash(PASSWORD))
+            connector.password_hasher = hasher
+            elapsed, latencies = asyncio.run(
+                run_logins(connector.app, args.logins, args.users, args.concurrency)
+            )
+            hasher.shutdown()
+            quantiles = statistics.quantiles(latencies, n=100)
+            print(
+                f"{rounds:>6} {workers:>7} {len(latencies) / elapsed:>9.1f} "
+                f"{quantiles[49] * 1000:>8.1f} {quantiles[94] * 1000:>8.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
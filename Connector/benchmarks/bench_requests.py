@@ -0,0 +1,182 @@
+"""
+Measure the CPU time per request of the JSON routes in process (no network, no
+chain), to see what request parsing and response serialization cost.
+
+Usage (from the Connector directory):
+    python benchmarks/bench_requests.py --requests 2000 --users 1000
+"""
+
+import argparse
+import asyncio
+import os
+import json
+import sqlite3
+import sys
+import tempfile
+import time
+import timeit
+
+CONNECTOR_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASSWORD = "benchmark-password"
+
+
+def seed_users(db_file: str, users: int, password_hash: str):
+    with sqlite3.connect(db_file) as connection:
+        connection.executemany(
+            'INSERT INTO user (username, email, phone, password_hash, role, "isPWLess", '
+            '"isOnline") VALUES (?, ?, ?, ?, ?, 0, 0)',
+            (
+                (f"user{i}", f"user{i}@user.com", "0", password_hash, "user")
+                for i in range(users)
+            ),
+        )
+
+
+async def measure(client, requests: int, call, rounds: int) -> float:
+    """
+    CPU microseconds per request of `call(client, i)`, the best of `rounds`
+    rounds so background threads and GC pauses do not skew it.
+    """
+    for i in range(min(requests, 20)):
+        await call(client, i)
+    best = None
+    for _ in range(rounds):
+        started = time.process_time()
+        for i in range(requests):
+            await call(client, i)
+        elapsed = time.process_time() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best / requests * 1e6
+
+
+async def run(app, token_for, requests: int, users: int, rounds: int):
+    import httpx
+
+    def ok(response):
+        assert response.status_code == 200, response.text
+        return response
+
+    async def login(client, i):
+        ok(
+            await client.post(
+                "/token",
+                json={"email": f"user{i % users}@user.com", "password": PASSWORD},
+            )
+        )
+
+    async def verify(client, i):
+        ok(await client.post("/verify-token", json={"token": token_for(i)}))
+
+    async def heartbeat(client, i):
+        ok(await client.post("/api/presence/heartbeat", json={"token": token_for(i)}))
+
+    async def profile(client, i):
+        ok(await client.post("/api/profile/", json={"token": token_for(i)}))
+
+    async def list_users(client, i):
+        ok(await client.get("/api/users", params={"limit": 1000}))
+
+    scenarios = [
+        ("token", login, requests // 4),
+        ("verify_token", verify, requests),
+        ("heartbeat", heartbeat, requests),
+        ("profile", profile, requests),
+        ("users_1000", list_users, max(requests // 20, 10)),
+    ]
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        print(f"{'route':>14} {'requests':>9} {'cpu us/req':>11}")
+        for name, call, count in scenarios:
+            cpu = await measure(client, count, call, rounds)
+            print(f"{name:>14} {count:>9} {cpu:>11.0f}")
+
+
+def codec_costs(users: list, repeat: int = 200):
+    """
+    Microseconds to parse a /token body and serialize a page of users: the old
+    way (request.json() twice, JSONResponse) against the typed model and
+    ORJSONResponse the routes use now.
+    """
+    from fastapi.responses import JSONResponse, ORJSONResponse
+
+    from model import LoginRequest
+
+    body = json.dumps({"email": "user1@user.com", "password": PASSWORD}).encode()
+
+    def cost(fn, number):
+        return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6
+
+    return [
+        (
+            "parse /token, json x2",
+            cost(lambda: (json.loads(body), json.loads(body)), repeat * 50),
+        ),
+        (
+            "parse /token, model",
+            cost(lambda: LoginRequest.model_validate_json(body), repeat * 50),
+        ),
+        (f"{len(users)} users, json", cost(lambda: JSONResponse(users).body, repeat)),
+        (
+            f"{len(users)} users, orjson",
+            cost(lambda: ORJSONResponse(users).body, repeat),
+        ),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    db_file = os.path.join(tempfile.mkdtemp(), "bench.db")
+    os.environ.update(
+        {
+            "CONNECTOR_DATABASE_FILE": db_file,
+            "CONNECTOR_LOG_FILE": "",
+            "CONNECTOR_LOG_CONSOLE": "0",
+            # Keep bcrypt from dominating the /token numbers
+            "CONNECTOR_PASSWORD_HASH_ROUNDS": "4",
+        }
+    )
+    os.chdir(CONNECTOR_DIR)
+    sys.path.insert(0, CONNECTOR_DIR)
+
+    import main as connector
+    from passwords import pwd_context
+
+    connector.run_migrations()
+    seed_users(db_file, args.users, pwd_context.hash(PASSWORD))
+    tokens = [
+        connector.create_access_token(
+            data={"sub": f"user{i}@user.com", "uid": i + 1, "role": "user"}
+        )
+        for i in range(args.users)
+    ]
+    from sqlmodel import Session
+
+    from users import list_users, parse_fields
+
+    with Session(connector.engine) as session:
+        page, _ = list_users(session, parse_fields(None), None, 1000)
+    print(f"{'codec':>24} {'us':>9}")
+    for name, us in codec_costs(page):
+        print(f"{name:>24} {us:>9.1f}")
+    print()
+
+    asyncio.run(
+        run(
+            connector.app,
+            lambda i: tokens[i % len(tokens)],
+            args.requests,
+            args.users,
+            args.rounds,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
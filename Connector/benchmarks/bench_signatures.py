@@ -0,0 +1,69 @@
+"""
+Measure signature verifications per second, inline on one core and on the
+SignatureVerifier process pool.
+
+Usage (from the Connector directory):
+    python benchmarks/bench_signatures.py --signatures 2000 --workers 1 2 4
+"""
+
+import argparse
+import asyncio
+import os
+import secrets
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from eth_account import Account
+from eth_account.messages import encode_defunct
+
+from signatures import SignatureVerifier, verify_signatures
+
+
+def make_items(count: int):
+    account = Account.create()
+    items = []
+    for _ in range(count):
+        message = secrets.token_hex(32)
+        signature = account.sign_message(encode_defunct(text=message)).signature
+        items.append((account.address, message, signature.hex()))
+    return items
+
+
+async def run_pool(items, workers: int):
+    verifier = SignatureVerifier(workers=workers)
+    verifier.warm_up()
+    start = time.perf_counter()
+    results = await verifier.verify_many(items)
+    elapsed = time.perf_counter() - start
+    verifier.shutdown()
+    assert all(results)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--signatures", type=int, default=2000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    items = make_items(args.signatures)
+
+    start = time.perf_counter()
+    assert all(verify_signatures(items))
+    elapsed = time.perf_counter() - start
+    rate = len(items) / elapsed
+    print(f"inline     : {rate:8.0f} verifications/s ({rate:.0f} per core)")
+
+    for workers in args.workers:
+        elapsed = asyncio.run(run_pool(items, workers))
+        rate = len(items) / elapsed
+        print(
+            f"{workers} worker(s): {rate:8.0f} verifications/s "
+            f"({rate / workers:.0f} per core)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Startup profile: where the time to import the app goes (per top-level package,
+from python -X importtime) and how long a fresh process takes to import main
+and run the startup hook, with and without CONNECTOR_WARMUP.
+
+Usage (from the Connector directory):
+    python benchmarks/bench_startup.py --top 15 --runs 3
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+
+CONNECTOR_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+READY_SCRIPT = """
+import time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(main.app):
+    ready = time.perf_counter()
+print(imported - started, ready - imported)
+"""
+
+
+def run_python(args, env):
+    return subprocess.run(
+        [sys.executable, *args],
+        cwd=CONNECTOR_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def import_breakdown(env) -> dict:
+    """
+    Import time in seconds spent in each top-level package (the self time of
+    all its modules) while loading main, keyed by package.
+    """
+    stderr = run_python(["-X", "importtime", "-c", "import main"], env).stderr
+    packages = defaultdict(float)
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        own, _, name = line[len("import time:") :].split("|")
+        packages[name.strip().split(".")[0]] += int(own) / 1e6
+    return dict(packages)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="connector-startup-")
+    env = {
+        **os.environ,
+        "CONNECTOR_DATABASE_FILE": os.path.join(workdir, "bench.db"),
+        "CONNECTOR_LOG_FILE": "",
+        "CONNECTOR_LOG_CONSOLE": "0",
+        "CONNECTOR_INDEXER": "0",
+        "CONNECTOR_DID_EVENT_POLL_INTERVAL": "0",
+    }
+
+    packages = import_breakdown(env)
+    total = sum(packages.values())
+    print(f"{'package':>24} {'ms':>8} {'share':>6}")
+    for name, seconds in sorted(packages.items(), key=lambda p: -p[1])[: args.top]:
+        print(f"{name:>24} {seconds * 1000:>8.0f} {seconds / total:>6.0%}")
+    print(f"{'total':>24} {total * 1000:>8.0f}")
+
+    # Without a node the RPC warm-up steps still import web3 but then fail (and
+    # are logged), so set CONNECTOR_RPC_URL to a running node for real numbers
+    print(f"\n{'warm-up':>8} {'import ms':>10} {'startup ms':>11} {'ready ms':>9}")
+    for warmup in ("0", "1"):
+        imports, startups = [], []
+        for _ in range(args.runs):
+            output = run_python(
+                ["-c", READY_SCRIPT], {**env, "CONNECTOR_WARMUP": warmup}
+            ).stdout
+            imported, started = map(float, output.split()[-2:])
+            imports.append(imported)
+            startups.append(started)
+        imported = statistics.median(imports) * 1000
+        started = statistics.median(startups) * 1000
+        print(
+            f"{warmup:>8} {imported:>10.0f} {started:>11.0f} "
+            f"{imported + started:>9.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+"""
+Load-test the connector end to end: boots the FastAPI app under uvicorn against
+a temp SQLite database and an in-process eth-tester chain with DIDRegistry
+deployed (benchmarks/local_chain.py), drives concurrent scenarios over HTTP and
+writes throughput and p50/p95/p99 latency per scenario to a JSON file.
+
+Scenarios, in order (later ones use the users and tokens of earlier ones):
+  register      POST /api/auth/password/register
+  token         POST /token (password login)
+  verify_token  POST /verify-token
+  update_user   PUT /api/users/{id} toggling passwordless, which allocates a
+                pool account and queues its DID registration
+  profile       POST /api/profile/ (passwordless users resolve their DID)
+  pki_login     GET /api/auth/PKI/challenge + POST /api/auth/PKI/sign
+
+Usage (from the Connector directory):
+    pip install -r benchmarks/requirements.txt
+    python benchmarks/bench_suite.py --requests 500 --concurrency 16 --output new.json
+    python benchmarks/bench_suite.py --baseline old.json --output new.json
+
+Any CONNECTOR_* setting (e.g. CONNECTOR_DATABASE_ASYNC=1) can be set in the
+environment to benchmark that configuration.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+CONNECTOR_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, CONNECTOR_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+PASSWORD = "benchmark-password"
+JOB_DRAIN_TIMEOUT = 120
+
+
+def summarize(latencies, errors: int, duration: float) -> dict:
+    result = {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "duration_s": round(duration, 3),
+        "throughput_rps": round(len(latencies) / duration, 1) if duration else 0,
+    }
+    if len(latencies) >= 2:
+        quantiles = statistics.quantiles(latencies, n=100)
+        result.update(
+            {
+                "mean_ms": round(statistics.fmean(latencies) * 1000, 2),
+                "p50_ms": round(quantiles[49] * 1000, 2),
+                "p95_ms": round(quantiles[94] * 1000, 2),
+                "p99_ms": round(quantiles[98] * 1000, 2),
+            }
+        )
+    return result
+
+
+async def run_scenario(name, action, requests: int, concurrency: int) -> dict:
+    """
+    Call `action(i, worker)` `requests` times from `concurrency` workers. An
+    action fails by raising; its latency only counts when it succeeds.
+    """
+    latencies = []
+    errors = []
+    counter = iter(range(requests))
+
+    async def worker(index):
+        for i in counter:
+            started = time.perf_counter()
+            try:
+                await action(i, index)
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(w) for w in range(concurrency)))
+    result = summarize(latencies, len(errors), time.perf_counter() - started)
+    if errors:
+        result["first_error"] = errors[0]
+    print(
+        f"{name:>13} {result['throughput_rps']:>9} "
+        f"{result.get('p50_ms', '-'):>8} {result.get('p95_ms', '-'):>8} "
+        f"{result.get('p99_ms', '-'):>8} {result['errors']:>6}"
+    )
+    return result
+
+
+def check(response, status: int = 200):
+    if response.status_code != status:
+        raise RuntimeError(f"HTTP {response.status_code}: {response.text[:200]}")
+    return response
+
+
+async def run_suite(base_url: str, args) -> dict:
+    import httpx
+    from eth_account import Account
+    from eth_account.messages import encode_defunct
+
+    from utils import get_accounts
+
+    accounts = get_accounts()
+    users = args.users
+    emails = [f"bench{i}@user.com" for i in range(users)]
+    tokens = {}
+    user_ids = {}
+    job_ids = []
+    results = {}
+
+    limits = httpx.Limits(max_connections=args.concurrency * 2)
+    async with httpx.AsyncClient(
+        base_url=base_url, limits=limits, timeout=60
+    ) as client:
+
+        async def register(i, worker):
+            # Only the first `users` registrations create users; the rest are
+            # rejected as duplicates, which is still a full request
+            email = emails[i % users]
+            check(
+                await client.post(
+                    "/api/auth/password/register",
+                    json={
+                        "username": f"bench{i}",
+                        "email": email,
+                        "phone": "0",
+                        "role": "user",
+                        "password": PASSWORD,
+                    },
+                )
+            )
+
+        async def login(i, worker):
+            email = emails[i % users]
+            response = check(
+                await client.post("/token", json={"email": email, "password": PASSWORD})
+            )
+            tokens[email] = response.json()["access_token"]
+
+        async def verify(i, worker):
+            token = tokens[emails[i % users]]
+            check(await client.post("/verify-token", json={"token": token}))
+
+        async def update(i, worker):
+            # Each worker owns one user and flips it between passwordless and
+            # not, so workers never compete for the same row
+            user_id = user_ids[emails[worker]]
+            enable = i // update_workers % 2 == 0
+            response = check(
+                await client.put(f"/api/users/{user_id}", json={"isPWLess": enable})
+            )
+            job_id = response.json().get("job_id")
+            if job_id:
+                job_ids.append(job_id)
+
+        async def profile(i, worker):
+            token = tokens[emails[i % users]]
+            check(await client.post("/api/profile/", json={"token": token}))
+
+        async def pki_login(i, worker):
+            # One account per worker, a second challenge would replace the first
+            account = accounts[worker]
+            response = check(
+                await client.get(
+                    "/api/auth/PKI/challenge", params={"address": account["account"]}
+                )
+            )
+            message = response.json()["message"]
+            signature = Account.sign_message(
+                encode_defunct(text=message), account["privateKey"]
+            ).signature.hex()
+            check(
+                await client.post(
+                    "/api/auth/PKI/sign",
+                    json={
+                        "address": account["account"],
+                        "message": message,
+                        "signature": signature,
+                    },
+                )
+            )
+
+        print(
+            f"{'scenario':>13} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} "
+            f"{'p99 ms':>8} {'errors':>6}"
+        )
+        n, c = args.requests, args.concurrency
+        results["register"] = await run_scenario("register", register, max(n, users), c)
+
+        cursor = None
+        while True:
+            params = {"fields": "email", "limit": 1000}
+            if cursor:
+                params["cursor"] = cursor
+            response = check(await client.get("/api/users", params=params))
+            user_ids.update({user["email"]: user["id"] for user in response.json()})
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+
+        results["token"] = await run_scenario("token", login, max(n, users), c)
+        results["verify_token"] = await run_scenario("verify_token", verify, n, c)
+
+        # Bounded by the account pool and the number of users
+        update_workers = min(c, len(accounts), users)
+        # An odd number of rounds leaves every worker's user passwordless
+        rounds = max(1, n // update_workers) | 1
+        results["update_user"] = await run_scenario(
+            "update_user", update, rounds * update_workers, update_workers
+        )
+
+        started = time.perf_counter()
+        pending = set(job_ids)
+        succeeded = 0
+        while pending and time.perf_counter() - started < JOB_DRAIN_TIMEOUT:
+            for job_id in list(pending):
+                job = check(await client.get(f"/api/jobs/{job_id}")).json()
+                if job["status"] in ("succeeded", "failed"):
+                    pending.discard(job_id)
+                    succeeded += job["status"] == "succeeded"
+            if pending:
+                await asyncio.sleep(0.05)
+        results["did_registration_jobs"] = {
+            "jobs": len(job_ids),
+            "succeeded": succeeded,
+            "unfinished": len(pending),
+            "drain_s": round(time.perf_counter() - started, 3),
+        }
+
+        results["profile"] = await run_scenario("profile", profile, n, c)
+        results["pki_login"] = await run_scenario(
+            "pki_login", pki_login, n, min(c, len(accounts))
+        )
+    return results
+
+
+def start_server(app, port: int):
+    import uvicorn
+
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    )
+    thread = threading.Thread(target=server.run, name="uvicorn", daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("uvicorn failed to start")
+        time.sleep(0.05)
+    return server, thread
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=CONNECTOR_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline: dict, current: dict):
+    print(f"\n{'scenario':>13} {'req/s':>16} {'p95 ms':>18}  vs baseline")
+    for name, now in current["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before or "throughput_rps" not in now or "p95_ms" not in before:
+            continue
+
+        def change(old, new):
+            return f"{(new - old) / old * 100:+.0f}%" if old else "n/a"
+
+        print(
+            f"{name:>13} {now['throughput_rps']:>9} {change(before['throughput_rps'], now['throughput_rps']):>6} "
+            f"{now.get('p95_ms', 0):>11} {change(before['p95_ms'], now.get('p95_ms', 0)):>6}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="Earlier --output file to compare with")
+    args = parser.parse_args()
+    output = os.path.abspath(args.output)
+    baseline = os.path.abspath(args.baseline) if args.baseline else None
+
+    from local_chain import LocalChain, free_port
+
+    workdir = tempfile.mkdtemp(prefix="connector-bench-")
+    chain = LocalChain().start()
+    for key, value in {
+        "CONNECTOR_DATABASE_FILE": os.path.join(workdir, "bench.db"),
+        "CONNECTOR_LOG_FILE": os.path.join(workdir, "app.log"),
+        "CONNECTOR_LOG_CONSOLE": "0",
+        **chain.environ(),
+    }.items():
+        os.environ.setdefault(key, value)
+    # accounts.json and the default paths are relative to the Connector directory
+    os.chdir(CONNECTOR_DIR)
+
+    import main as connector
+
+    server, thread = start_server(connector.app, free_port())
+    try:
+        scenarios = asyncio.run(
+            run_suite(f"http://127.0.0.1:{server.config.port}", args)
+        )
+    finally:
+        server.should_exit = True
+        thread.join(timeout=30)
+        chain.stop()
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "users": args.users,
+            "settings": {
+                key: value
+                for key, value in os.environ.items()
+                if key.startswith("CONNECTOR_")
+                and key
+                not in (
+                    "CONNECTOR_DATABASE_FILE",
+                    "CONNECTOR_LOG_FILE",
+                    "CONNECTOR_RPC_URL",
+                    "CONNECTOR_DEPLOYMENT_DIR",
+                )
+            },
+        },
+        "scenarios": scenarios,
+    }
+    with open(output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"\nWrote {output}")
+
+    if baseline:
+        with open(baseline) as file:
+            compare(json.load(file), report)
+
+
+if __name__ == "__main__":
+    main()
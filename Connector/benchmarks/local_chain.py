@@ -0,0 +1,170 @@
+"""
+In-process stand-in for the Hardhat node: an eth-tester (py-evm) chain served
+over JSON-RPC on a local port, with DIDRegistry deployed and the accounts from
+accounts.json unlocked and funded.
+
+Needs the benchmark extras: pip install -r benchmarks/requirements.txt
+"""
+
+import asyncio
+import json
+import os
+import shutil
+import socket
+import tempfile
+import threading
+
+from aiohttp import web
+from eth_abi import encode
+
+CONNECTOR_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEPLOYMENT_DIR = os.path.join(
+    CONNECTOR_DIR, "..", "Blockchain", "ignition", "deployments", "chain-31337"
+)
+CONTRACT_ID = "DIDRegistryModule#DIDRegistry"
+# Selector of Error(string), how Hardhat reports require() messages
+ERROR_SELECTOR = "0x08c379a0"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class LocalChain:
+    """
+    Usage:
+        chain = LocalChain().start()
+        os.environ.update(chain.environ())
+    """
+
+    def __init__(self, port: int = 0, accounts_file: str = "accounts.json"):
+        self.port = port or free_port()
+        self.accounts_file = os.path.join(CONNECTOR_DIR, accounts_file)
+        self.deployment_dir = None
+        self.contract_address = None
+        self._loop = None
+        self._runner = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def environ(self) -> dict:
+        return {
+            "CONNECTOR_RPC_URL": self.url,
+            "CONNECTOR_DEPLOYMENT_DIR": self.deployment_dir,
+        }
+
+    def _setup_chain(self):
+        from web3 import EthereumTesterProvider, Web3
+
+        self.provider = EthereumTesterProvider()
+        self.w3 = Web3(self.provider)
+        self._request = self.provider.request_func(self.w3, self.w3.middleware_onion)
+        # eth-tester is not thread safe, requests are served one at a time
+        self._lock = threading.Lock()
+
+        tester = self.provider.ethereum_tester
+        funder = self.w3.eth.accounts[0]
+        with open(self.accounts_file) as file:
+            for account in json.load(file):
+                tester.add_account(account["privateKey"])
+                self.w3.eth.send_transaction(
+                    {
+                        "from": funder,
+                        "to": account["account"],
+                        "value": self.w3.to_wei(100, "ether"),
+                    }
+                )
+
+        with open(
+            os.path.join(DEPLOYMENT_DIR, "artifacts", f"{CONTRACT_ID}.json")
+        ) as file:
+            artifact = json.load(file)
+        contract = self.w3.eth.contract(
+            abi=artifact["abi"], bytecode=artifact["bytecode"]
+        )
+        tx = contract.constructor().transact({"from": funder})
+        self.contract_address = self.w3.eth.wait_for_transaction_receipt(
+            tx
+        ).contractAddress
+
+        # A deployment directory laid out like Hardhat Ignition's, for utils.getContract
+        self.deployment_dir = tempfile.mkdtemp(prefix="connector-chain-")
+        os.makedirs(os.path.join(self.deployment_dir, "artifacts"))
+        shutil.copy(
+            os.path.join(DEPLOYMENT_DIR, "artifacts", f"{CONTRACT_ID}.json"),
+            os.path.join(self.deployment_dir, "artifacts"),
+        )
+        with open(
+            os.path.join(self.deployment_dir, "deployed_addresses.json"), "w"
+        ) as file:
+            json.dump({CONTRACT_ID: self.contract_address}, file)
+
+    def _call(self, request: dict) -> dict:
+        from web3 import Web3
+
+        reply = {"jsonrpc": "2.0", "id": request.get("id")}
+        try:
+            with self._lock:
+                response = self._request(request["method"], request.get("params", []))
+        except Exception as e:
+            message = str(e)
+            error = {"code": -32000, "message": message}
+            if "reverted" in message:
+                reason = message.split("reverted: ")[-1]
+                error["data"] = ERROR_SELECTOR + encode(["string"], [reason]).hex()
+            reply["error"] = error
+            return reply
+        if "error" in response:
+            reply["error"] = response["error"]
+        else:
+            reply["result"] = json.loads(Web3.to_json(response["result"]))
+        return reply
+
+    async def _handle(self, request):
+        body = await request.json()
+        loop = asyncio.get_running_loop()
+        # Run the EVM off the server loop so batches do not stall other clients
+        if isinstance(body, list):
+            replies = [
+                await loop.run_in_executor(None, self._call, item) for item in body
+            ]
+            return web.json_response(replies)
+        return web.json_response(await loop.run_in_executor(None, self._call, body))
+
+    def start(self):
+        self._setup_chain()
+        ready = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            app = web.Application(client_max_size=16 * 1024 * 1024)
+            app.router.add_post("/", self._handle)
+            self._runner = web.AppRunner(app, access_log=None)
+            self._loop.run_until_complete(self._runner.setup())
+            self._loop.run_until_complete(
+                web.TCPSite(self._runner, "127.0.0.1", self.port).start()
+            )
+            ready.set()
+            loop = self._loop
+            loop.run_forever()
+            loop.close()
+
+        threading.Thread(target=run, name="local-chain", daemon=True).start()
+        ready.wait()
+        return self
+
+    def stop(self):
+        if self._loop is not None:
+            # Close open connections before the loop goes away
+            asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result(
+                timeout=10
+            )
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop = None
+        if self.deployment_dir:
+            shutil.rmtree(self.deployment_dir, ignore_errors=True)
@@ -0,0 +1,152 @@
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+from sqlalchemy import text
+from sqlmodel import Session
+
+from database import engine
+
+CHALLENGE_STORE = os.getenv("CONNECTOR_CHALLENGE_STORE", "sqlite")  # or "memory"
+CHALLENGE_TTL = float(os.getenv("CONNECTOR_CHALLENGE_TTL", "300"))
+CHALLENGE_MAX_ENTRIES = int(os.getenv("CONNECTOR_CHALLENGE_MAX_ENTRIES", "10000"))
+
+
+class ChallengeStore(ABC):
+    """
+    Pending passwordless login challenges, one per address.
+
+    Every challenge expires after `ttl` seconds and can be consumed only once.
+    The store never holds more than `max_entries`; the oldest challenges are
+    evicted first.
+    """
+
+    def __init__(
+        self, ttl: float = CHALLENGE_TTL, max_entries: int = CHALLENGE_MAX_ENTRIES
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+    @abstractmethod
+    def put(self, address: str, challenge: str):
+        pass
+
+    @abstractmethod
+    def consume(self, address: str, challenge: str) -> bool:
+        """
+        Remove the challenge for `address` and return True if it matched and
+        had not expired. A challenge is gone after this call either way.
+        """
+
+    @abstractmethod
+    def __len__(self):
+        pass
+
+
+class MemoryChallengeStore(ChallengeStore):
+    """
+    Challenges kept in this process only (single worker setups).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, address: str, challenge: str):
+        key = address.lower()
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (challenge, time.time() + self.ttl)
+            # Entries are in insertion order, so expired ones sit at the front
+            now = time.time()
+            while self._data and (
+                len(self._data) > self.max_entries
+                or next(iter(self._data.values()))[1] <= now
+            ):
+                self._data.popitem(last=False)
+
+    def consume(self, address: str, challenge: str) -> bool:
+        with self._lock:
+            entry = self._data.pop(address.lower(), None)
+        if entry is None:
+            return False
+        stored, expires_at = entry
+        return stored == challenge and expires_at > time.time()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteChallengeStore(ChallengeStore):
+    """
+    Challenges kept in the `challenge` table, shared by every worker process
+    using the same database. Consumption is a single DELETE ... RETURNING, so a
+    challenge can only ever be redeemed by one request.
+    """
+
+    def __init__(self, *args, engine=engine, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.engine = engine
+
+    def put(self, address: str, challenge: str):
+        now = time.time()
+        with Session(self.engine) as session:
+            session.execute(
+                text(
+                    "INSERT OR REPLACE INTO challenge (address, challenge, expires_at) "
+                    "VALUES (:address, :challenge, :expires_at)"
+                ),
+                {
+                    "address": address.lower(),
+                    "challenge": challenge,
+                    "expires_at": now + self.ttl,
+                },
+            )
+            session.execute(
+                text("DELETE FROM challenge WHERE expires_at <= :now"), {"now": now}
+            )
+            # Cap the table; every entry has the same TTL, so the soonest to
+            # expire are also the oldest
+            session.execute(
+                text(
+                    "DELETE FROM challenge WHERE address IN ("
+                    "SELECT address FROM challenge ORDER BY expires_at DESC "
+                    "LIMIT -1 OFFSET :max_entries)"
+                ),
+                {"max_entries": self.max_entries},
+            )
+            session.commit()
+
+    def consume(self, address: str, challenge: str) -> bool:
+        with Session(self.engine) as session:
+            row = session.execute(
+                text(
+                    "DELETE FROM challenge WHERE address = :address "
+                    "RETURNING challenge, expires_at"
+                ),
+                {"address": address.lower()},
+            ).first()
+            session.commit()
+        return (
+            row is not None
+            and row.challenge == challenge
+            and row.expires_at > time.time()
+        )
+
+    def __len__(self):
+        with Session(self.engine) as session:
+            return session.execute(text("SELECT COUNT(*) FROM challenge")).scalar()
+
+
+def create_challenge_store(kind: str = CHALLENGE_STORE) -> ChallengeStore:
+    if kind == "memory":
+        return MemoryChallengeStore()
+    if kind == "sqlite":
+        return SQLiteChallengeStore()
+    raise ValueError(f"Unknown challenge store: {kind}")
+
+
+challenge_store = create_challenge_store()
@@ -0,0 +1,120 @@
+import argparse
+
+from logs import setup_logging
+from utils import get_accounts
+
+
+def register_dids(args):
+    from nonce_manager import register_dids_bulk
+
+    accounts = get_accounts()
+    if args.limit:
+        accounts = accounts[: args.limit]
+
+    private_key = None
+    if args.sender:
+        private_key = next(
+            (
+                account["privateKey"]
+                for account in accounts
+                if account["account"].lower() == args.sender.lower()
+            ),
+            None,
+        )
+
+    print(f"Registering DIDs for {len(accounts)} accounts...")
+    results = register_dids_bulk(accounts, sender=args.sender, private_key=private_key)
+
+    counts = {}
+    for ptx in results:
+        counts[ptx.status] = counts.get(ptx.status, 0) + 1
+        if ptx.status != "succeeded":
+            print(f"  {ptx.key}: {ptx.status} {ptx.error or ''}")
+    print(f"Done: {counts}")
+
+
+def import_users(args):
+    from sqlmodel import Session
+
+    from account_pool import account_pool
+    from database import engine
+    from migrations import run_migrations
+    from user_import import IMPORT_BATCH_SIZE, detect_format
+    from user_import import import_users as run_import
+
+    run_migrations()
+    if args.passwordless:
+        with Session(engine) as session:
+            account_pool.load(session)
+    format = args.format or detect_format(args.file)
+    print(f"Importing users from {args.file} ({format})...")
+    with open(args.file, encoding="utf-8-sig", newline="") as file:
+        report = run_import(
+            file, format, args.passwordless, args.batch_size or IMPORT_BATCH_SIZE
+        )
+
+    for error in report["errors"]:
+        print(f"  row {error['row']} {error['email'] or ''}: {error['error']}")
+    if report["errors_truncated"]:
+        print("  (more errors not shown)")
+    counts = {
+        k: v for k, v in report.items() if k not in ("errors", "errors_truncated")
+    }
+    print(f"Done: {counts}")
+    if report["jobs"]:
+        print("DID registrations are queued, a running server will send them")
+
+
+def index_chain(args):
+    from database import create_db_and_tables
+    from indexer import chain_indexer
+
+    create_db_and_tables()
+    print("Indexing DIDRegistry events, Ctrl+C to stop...")
+    try:
+        chain_indexer.start()
+        chain_indexer._thread.join()
+    except KeyboardInterrupt:
+        chain_indexer.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Connector maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    parser_register = commands.add_parser(
+        "register-dids", help="Register DIDs for the accounts in accounts.json"
+    )
+    parser_register.add_argument("--limit", type=int, default=0)
+    parser_register.add_argument(
+        "--sender", help="Send every transaction from this address"
+    )
+    parser_register.set_defaults(func=register_dids)
+
+    parser_import = commands.add_parser(
+        "import-users", help="Bulk import users from a CSV or NDJSON file"
+    )
+    parser_import.add_argument("file")
+    parser_import.add_argument(
+        "--format", choices=["csv", "ndjson"], help="Default: from the file name"
+    )
+    parser_import.add_argument(
+        "--passwordless",
+        action="store_true",
+        help="Assign pool accounts and queue DID registration for every user",
+    )
+    parser_import.add_argument("--batch-size", type=int)
+    parser_import.set_defaults(func=import_users)
+
+    parser_index = commands.add_parser(
+        "index", help="Run the DIDRegistry event indexer in the foreground"
+    )
+    parser_index.set_defaults(func=index_chain)
+
+    args = parser.parse_args()
+    setup_logging()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import os
+
+from sqlalchemy import event
+from sqlmodel import Session, create_engine
+from starlette.concurrency import run_in_threadpool
+
+from metrics import instrument_engine
+
+# Database setup
+sqlite_file_name = os.getenv("CONNECTOR_DATABASE_FILE", "./awais_database.db")
+sqlite_url = f"sqlite:///{sqlite_file_name}"
+connect_args = {"check_same_thread": False}
+
+# Serve route handlers from an aiosqlite engine instead of the sync one
+DATABASE_ASYNC = os.getenv("CONNECTOR_DATABASE_ASYNC", "0") == "1"
+# WAL lets readers run while a write is in progress; use "delete" for the old
+# rollback journal
+SQLITE_JOURNAL_MODE = os.getenv("CONNECTOR_SQLITE_JOURNAL_MODE", "wal")
+# NORMAL only syncs at WAL checkpoints, which is still safe against corruption
+SQLITE_SYNCHRONOUS = os.getenv("CONNECTOR_SQLITE_SYNCHRONOUS", "normal")
+SQLITE_CACHE_KB = int(os.getenv("CONNECTOR_SQLITE_CACHE_KB", "65536"))
+# Milliseconds a writer waits for the lock before "database is locked"
+SQLITE_BUSY_TIMEOUT = int(os.getenv("CONNECTOR_SQLITE_BUSY_TIMEOUT", "5000"))
+DB_POOL_SIZE = int(os.getenv("CONNECTOR_DB_POOL_SIZE", "8"))
+DB_MAX_OVERFLOW = int(os.getenv("CONNECTOR_DB_MAX_OVERFLOW", "8"))
+DB_POOL_TIMEOUT = float(os.getenv("CONNECTOR_DB_POOL_TIMEOUT", "30"))
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT}")
+    cursor.execute(f"PRAGMA journal_mode = {SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous = {SQLITE_SYNCHRONOUS}")
+    # Negative values are KiB rather than pages
+    cursor.execute(f"PRAGMA cache_size = -{SQLITE_CACHE_KB}")
+    cursor.execute("PRAGMA temp_store = memory")
+    cursor.close()
+
+
+def pool_args():
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+    }
+
+
+engine = create_engine(sqlite_url, connect_args=connect_args, **pool_args())
+event.listen(engine, "connect", set_sqlite_pragmas)
+instrument_engine(engine)
+
+
+def create_async_sqlite_engine(file_name: str = sqlite_file_name):
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+    # Older SQLAlchemy releases default aiosqlite to NullPool, opening a new
+    # connection (and thread) per session
+    async_engine = create_async_engine(
+        f"sqlite+aiosqlite:///{file_name}",
+        connect_args=connect_args,
+        poolclass=AsyncAdaptedQueuePool,
+        **pool_args(),
+    )
+    # aiosqlite's adapter exposes the same cursor API to the sync-level event
+    event.listen(async_engine.sync_engine, "connect", set_sqlite_pragmas)
+    instrument_engine(async_engine.sync_engine)
+    return async_engine
+
+
+async_engine = create_async_sqlite_engine() if DATABASE_ASYNC else None
+
+
+def create_db_and_tables():
+    # The schema is owned by the versioned migrations
+    from migrations import run_migrations
+
+    run_migrations(engine)
+
+
+def get_session():
+    with Session(engine) as session:
+        yield session
+
+
+async def get_db():
+    """
+    Session for async route handlers: an AsyncSession on the aiosqlite engine in
+    async mode, otherwise a regular Session. Use it through run_db(). Objects
+    are not expired on commit, so they can be read afterwards without a lazy
+    load on the event loop.
+    """
+    if async_engine is None:
+        with Session(engine, expire_on_commit=False) as session:
+            yield session
+        return
+
+    from sqlmodel.ext.asyncio.session import AsyncSession
+
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
+
+
+async def run_db(session, fn, *args):
+    """
+    Run fn(sync_session, *args) without blocking the event loop, so the sync
+    helpers (account pool, token validator, ...) work unchanged in both modes.
+    """
+    if isinstance(session, Session):
+        return await run_in_threadpool(fn, session, *args)
+    return await session.run_sync(fn, *args)
+
+
+def save(session: Session, *instances):
+    """
+    Add and commit `instances`, for use with run_db().
+    """
+    for instance in instances:
+        session.add(instance)
+    session.commit()
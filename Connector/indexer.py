@@ -0,0 +1,371 @@
+import logging
+import os
+import threading
+
+from sqlmodel import Session, col, delete, select
+
+import utils
+from database import engine
+from model import (
+    ChainEvent,
+    IndexedBlock,
+    IndexedCredential,
+    IndexedDID,
+    IndexerCheckpoint,
+)
+
+INDEXER_ENABLED = os.getenv("CONNECTOR_INDEXER", "1") == "1"
+INDEXER_START_BLOCK = int(os.getenv("CONNECTOR_INDEXER_START_BLOCK", "0"))
+# Blocks behind the head that are considered final enough to index
+INDEXER_CONFIRMATIONS = int(os.getenv("CONNECTOR_INDEXER_CONFIRMATIONS", "2"))
+INDEXER_BATCH_BLOCKS = int(os.getenv("CONNECTOR_INDEXER_BATCH_BLOCKS", "500"))
+INDEXER_POLL_INTERVAL = float(os.getenv("CONNECTOR_INDEXER_POLL_INTERVAL", "2"))
+# How many recent block hashes are kept to locate the fork point of a reorg
+INDEXER_HASH_WINDOW = int(os.getenv("CONNECTOR_INDEXER_HASH_WINDOW", "256"))
+# revokeDID emits no event, so revocations are found by scanning block transactions
+INDEXER_TRACK_REVOCATIONS = os.getenv("CONNECTOR_INDEXER_TRACK_REVOCATIONS", "1") == "1"
+
+CHECKPOINT_NAME = "DIDRegistry"
+
+logger = logging.getLogger(__name__)
+
+
+def _hex(value) -> str:
+    return value.hex() if isinstance(value, bytes) else value
+
+
+class ChainIndexer:
+    """
+    Follows DIDRegistered, VCIssued and VCRevoked logs (plus revokeDID calls) from
+    a checkpointed block height and mirrors the registry into SQLite, so DIDs and
+    credentials can be looked up by primary key or index without the node.
+
+    Only blocks at least `confirmations` deep are indexed. If the chain still
+    reorganises below that, the checkpoint hash no longer matches: the indexer
+    walks back through the stored block hashes to the fork point, deletes the
+    events after it and rebuilds the affected rows from the remaining events.
+    """
+
+    def __init__(
+        self,
+        confirmations: int = INDEXER_CONFIRMATIONS,
+        batch_blocks: int = INDEXER_BATCH_BLOCKS,
+        poll_interval: float = INDEXER_POLL_INTERVAL,
+        start_block: int = INDEXER_START_BLOCK,
+    ):
+        self.confirmations = confirmations
+        self.batch_blocks = batch_blocks
+        self.poll_interval = poll_interval
+        self.start_block = start_block
+        self._stop = threading.Event()
+        self._thread = None
+
+    # Checkpoint handling
+
+    def _checkpoint(self, session: Session, contract_address: str):
+        checkpoint = session.get(IndexerCheckpoint, CHECKPOINT_NAME)
+        if checkpoint and checkpoint.contract_address != contract_address:
+            # The registry was redeployed, the old mirror is meaningless
+            logger.warning("Contract changed to %s, reindexing", contract_address)
+            self._wipe(session)
+            checkpoint = None
+        if checkpoint is None:
+            checkpoint = IndexerCheckpoint(
+                name=CHECKPOINT_NAME,
+                contract_address=contract_address,
+                block_number=self.start_block - 1,
+            )
+            session.add(checkpoint)
+            session.commit()
+            session.refresh(checkpoint)
+        return checkpoint
+
+    def _wipe(self, session: Session):
+        for table in (ChainEvent, IndexedDID, IndexedCredential, IndexedBlock):
+            session.exec(delete(table))
+        session.exec(delete(IndexerCheckpoint))
+        session.commit()
+
+    # Reorg handling
+
+    def _find_fork_point(self, session: Session, checkpoint: IndexerCheckpoint):
+        blocks = session.exec(
+            select(IndexedBlock).order_by(col(IndexedBlock.number).desc())
+        ).all()
+        for block in blocks:
+            if _hex(utils.w3.eth.get_block(block.number)["hash"]) == block.hash:
+                return block.number
+        # Fork is older than the hash window, rebuild everything we cannot verify
+        return (blocks[-1].number - 1) if blocks else self.start_block - 1
+
+    def rollback(self, session: Session, checkpoint: IndexerCheckpoint, height: int):
+        """
+        Drop everything indexed above `height` and rebuild the affected rows.
+        """
+        logger.warning("Reorg detected, rolling back to block %s", height)
+        events = session.exec(
+            select(ChainEvent).where(ChainEvent.block_number > height)
+        ).all()
+        owners = {e.address for e in events if e.event.startswith("DID")}
+        holders = {e.address for e in events if e.event.startswith("VC")}
+
+        session.exec(delete(ChainEvent).where(ChainEvent.block_number > height))
+        session.exec(delete(IndexedBlock).where(IndexedBlock.number > height))
+        if owners:
+            session.exec(delete(IndexedDID).where(col(IndexedDID.address).in_(owners)))
+        if holders:
+            session.exec(
+                delete(IndexedCredential).where(
+                    col(IndexedCredential.holder).in_(holders)
+                )
+            )
+
+        replay = session.exec(
+            select(ChainEvent)
+            .where(col(ChainEvent.address).in_(owners | holders))
+            .order_by(ChainEvent.block_number, ChainEvent.log_index)
+        ).all()
+        for event in replay:
+            if (event.event.startswith("DID") and event.address in owners) or (
+                event.event.startswith("VC") and event.address in holders
+            ):
+                self._apply(session, event)
+
+        block = session.get(IndexedBlock, height)
+        checkpoint.block_number = height
+        checkpoint.block_hash = block.hash if block else None
+        session.add(checkpoint)
+        session.commit()
+        for address in owners:
+            utils.did_cache.invalidate(address)
+
+    # Event handling
+
+    def _apply(self, session: Session, event: ChainEvent):
+        if event.event == "DIDRegistered":
+            session.merge(
+                IndexedDID(
+                    address=event.address,
+                    did=event.did,
+                    block_number=event.block_number,
+                )
+            )
+        elif event.event == "DIDRevoked":
+            did = session.get(IndexedDID, event.address)
+            if did:
+                session.delete(did)
+        elif event.event == "VCIssued":
+            session.add(
+                IndexedCredential(
+                    holder=event.address,
+                    issuer=event.issuer,
+                    credential_hash=event.credential_hash,
+                    issued_block=event.block_number,
+                )
+            )
+        elif event.event == "VCRevoked":
+            # Same rule as revokeVC: the oldest live match from this issuer
+            credential = session.exec(
+                select(IndexedCredential)
+                .where(
+                    IndexedCredential.holder == event.address,
+                    IndexedCredential.issuer == event.issuer,
+                    IndexedCredential.credential_hash == event.credential_hash,
+                    IndexedCredential.is_revoked == False,
+                )
+                .order_by(IndexedCredential.id)
+            ).first()
+            if credential:
+                credential.is_revoked = True
+                credential.revoked_block = event.block_number
+                session.add(credential)
+        # Flush so later events in the same batch see this one
+        session.flush()
+
+    def _fetch_events(self, contract, blocks, from_block: int, to_block: int):
+        events = []
+        for name in ("DIDRegistered", "VCIssued", "VCRevoked"):
+            logs = getattr(contract.events, name).get_logs(
+                fromBlock=from_block, toBlock=to_block
+            )
+            for log in logs:
+                block_hash = _hex(log["blockHash"])
+                if blocks[log["blockNumber"]] != block_hash:
+                    raise RuntimeError("Chain changed while indexing")
+                args = log["args"]
+                event = ChainEvent(
+                    block_number=log["blockNumber"],
+                    block_hash=block_hash,
+                    tx_hash=_hex(log["transactionHash"]),
+                    log_index=log["logIndex"],
+                    event=name,
+                    address=(args.get("user") or args.get("holder")).lower(),
+                )
+                if name == "DIDRegistered":
+                    event.did = args["did"]
+                else:
+                    event.credential_hash = args["credentialHash"]
+                    if name == "VCIssued":
+                        event.issuer = args["issuer"].lower()
+                    else:
+                        # VCRevoked has no issuer field, the sender is the issuer
+                        tx = utils.w3.eth.get_transaction(log["transactionHash"])
+                        event.issuer = tx["from"].lower()
+                events.append(event)
+        return events
+
+    def _fetch_revocations(self, contract, block) -> list:
+        events = []
+        for tx in block["transactions"]:
+            if not tx["to"] or tx["to"].lower() != contract.address.lower():
+                continue
+            try:
+                function, args = contract.decode_function_input(
+                    tx.get("input", tx.get("data"))
+                )
+            except ValueError:
+                continue
+            if function.fn_name != "revokeDID":
+                continue
+            if utils.w3.eth.get_transaction_receipt(tx["hash"])["status"] != 1:
+                continue
+            events.append(
+                ChainEvent(
+                    block_number=block["number"],
+                    block_hash=_hex(block["hash"]),
+                    tx_hash=_hex(tx["hash"]),
+                    log_index=-1,
+                    event="DIDRevoked",
+                    address=args["user"].lower(),
+                )
+            )
+        return events
+
+    def poll_once(self) -> int:
+        """
+        Index the next range of confirmed blocks. Returns the number of blocks.
+        """
+        contract = utils.initialize_contract()
+        head = utils.w3.eth.block_number
+        target = head - self.confirmations
+
+        with Session(engine) as session:
+            checkpoint = self._checkpoint(session, contract.address)
+            if checkpoint.block_hash is not None:
+                current = utils.w3.eth.get_block(checkpoint.block_number)
+                if _hex(current["hash"]) != checkpoint.block_hash:
+                    self.rollback(
+                        session, checkpoint, self._find_fork_point(session, checkpoint)
+                    )
+
+            from_block = checkpoint.block_number + 1
+            to_block = min(target, from_block + self.batch_blocks - 1)
+            if to_block < from_block:
+                return 0
+
+            blocks = {}
+            events = []
+            for number in range(from_block, to_block + 1):
+                block = utils.w3.eth.get_block(
+                    number, full_transactions=INDEXER_TRACK_REVOCATIONS
+                )
+                blocks[number] = _hex(block["hash"])
+                if INDEXER_TRACK_REVOCATIONS:
+                    events.extend(self._fetch_revocations(contract, block))
+            events.extend(self._fetch_events(contract, blocks, from_block, to_block))
+            events.sort(key=lambda e: (e.block_number, e.log_index))
+
+            for event in events:
+                session.add(event)
+                self._apply(session, event)
+            for number, block_hash in blocks.items():
+                session.merge(IndexedBlock(number=number, hash=block_hash))
+            session.exec(
+                delete(IndexedBlock).where(
+                    IndexedBlock.number <= to_block - INDEXER_HASH_WINDOW
+                )
+            )
+            checkpoint.block_number = to_block
+            checkpoint.block_hash = blocks[to_block]
+            session.add(checkpoint)
+            owners = {e.address for e in events if e.event.startswith("DID")}
+            session.commit()
+
+        for address in owners:
+            utils.did_cache.invalidate(address)
+        return len(blocks)
+
+    def status(self):
+        with Session(engine) as session:
+            checkpoint = session.get(IndexerCheckpoint, CHECKPOINT_NAME)
+            return {
+                "running": bool(self._thread and self._thread.is_alive()),
+                "contract_address": checkpoint.contract_address if checkpoint else None,
+                "block_number": checkpoint.block_number if checkpoint else None,
+                "confirmations": self.confirmations,
+            }
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                indexed = self.poll_once()
+            except Exception as e:
+                logger.error("Error indexing blocks: %s", e)
+                indexed = 0
+            # Catch up without sleeping while there is a backlog
+            if not indexed and self._stop.wait(self.poll_interval):
+                break
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="chain-indexer", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.poll_interval + 1)
+            self._thread = None
+
+
+chain_indexer = ChainIndexer()
+
+
+# Lookups against the local mirror
+
+
+def get_indexed_did(session: Session, address: str):
+    return session.get(IndexedDID, address.lower())
+
+
+def get_indexed_credentials(
+    session: Session, holder: str | None = None, credential_hash: str | None = None
+):
+    statement = select(IndexedCredential)
+    if holder:
+        statement = statement.where(IndexedCredential.holder == holder.lower())
+    if credential_hash:
+        statement = statement.where(
+            IndexedCredential.credential_hash == credential_hash
+        )
+    return session.exec(statement.order_by(IndexedCredential.id)).all()
+
+
+def verify_indexed_credential(session: Session, holder: str, credential_hash: str):
+    """
+    Local equivalent of DIDRegistry.verifyVC.
+    """
+    return (
+        session.exec(
+            select(IndexedCredential.id).where(
+                IndexedCredential.holder == holder.lower(),
+                IndexedCredential.credential_hash == credential_hash,
+                IndexedCredential.is_revoked == False,
+            )
+        ).first()
+        is not None
+    )
@@ -0,0 +1,267 @@
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlmodel import Session, select, update
+
+import utils
+from database import engine
+from model import Job
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.getenv("CONNECTOR_JOB_WORKERS", "1"))
+JOB_MAX_ATTEMPTS = int(os.getenv("CONNECTOR_JOB_MAX_ATTEMPTS", "3"))
+# Seconds an idle worker sleeps before checking the table again
+JOB_POLL_INTERVAL = float(os.getenv("CONNECTOR_JOB_POLL_INTERVAL", "1"))
+JOB_RECEIPT_TIMEOUT = float(os.getenv("CONNECTOR_JOB_RECEIPT_TIMEOUT", "120"))
+JOB_CALLBACK_TIMEOUT = float(os.getenv("CONNECTOR_JOB_CALLBACK_TIMEOUT", "5"))
+# Seconds a `running` job may go without an update before its worker is taken
+# for dead and the job is requeued; must exceed the send plus the receipt wait
+JOB_LEASE = float(os.getenv("CONNECTOR_JOB_LEASE", str(JOB_RECEIPT_TIMEOUT + 60)))
+
+# kind -> (function that sends the transaction, payload key of the DID owner)
+JOB_HANDLERS = {
+    "register_did": (utils.submit_register_did, "address"),
+    "revoke_did": (utils.submit_revoke_did, "address"),
+    "issue_vc": (utils.submit_issue_vc, None),
+}
+
+
+class JobQueue:
+    """
+    Durable queue of on-chain writes stored in the `job` table.
+
+    Routes enqueue a job and return its id straight away; worker threads send the
+    transaction, wait for the receipt and record the outcome. A job is claimed
+    with one conditional UPDATE, so workers of several processes never take the
+    same one. Jobs left `running` for longer than JOB_LEASE (their process
+    died) are requeued by any live worker: if their transaction was already
+    sent only the receipt is awaited, otherwise it is sent again.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS):
+        self.workers = workers
+        self._recovered_at = 0.0
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self._listeners = []
+
+    def add_listener(self, callback):
+        """
+        Register a callable invoked with the finished Job (succeeded or failed).
+        """
+        self._listeners.append(callback)
+
+    def enqueue(
+        self,
+        kind: str,
+        payload: dict,
+        callback_url: str | None = None,
+        session: Session | None = None,
+    ):
+        """
+        Queue an on-chain write. When `session` is given the job is only flushed
+        into it, so it commits atomically with the caller's own changes; call
+        `notify()` after that commit.
+        """
+        if kind not in JOB_HANDLERS:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job = Job(kind=kind, payload=json.dumps(payload), callback_url=callback_url)
+        if session is not None:
+            session.add(job)
+            session.flush()
+            return job
+
+        with Session(engine) as session:
+            session.add(job)
+            session.commit()
+            session.refresh(job)
+        self.notify()
+        return job
+
+    def enqueue_many(self, kind: str, payloads: list, session: Session):
+        """
+        Queue one job per payload, flushed into `session` in one batch of
+        inserts; call `notify()` after the caller commits.
+        """
+        if kind not in JOB_HANDLERS:
+            raise ValueError(f"Unknown job kind: {kind}")
+        jobs = [Job(kind=kind, payload=json.dumps(payload)) for payload in payloads]
+        session.add_all(jobs)
+        session.flush()
+        return jobs
+
+    def notify(self):
+        """
+        Wake an idle worker to pick up newly committed jobs.
+        """
+        self._wakeup.set()
+
+    def describe(self, job: Job):
+        return {
+            "id": job.id,
+            "kind": job.kind,
+            "payload": json.loads(job.payload),
+            "status": job.status,
+            "attempts": job.attempts,
+            "tx_hash": job.tx_hash,
+            "block_number": job.block_number,
+            "receipt_status": job.receipt_status,
+            "error": job.error,
+            "created_at": job.created_at.isoformat(),
+            "updated_at": job.updated_at.isoformat(),
+        }
+
+    def _claim(self):
+        # Conditional on the job still being queued, so of two workers (of this
+        # or another process) racing for it only one gets a row back
+        next_job = (
+            select(Job.id)
+            .where(Job.status == "queued")
+            .order_by(Job.id)
+            .limit(1)
+            .scalar_subquery()
+        )
+        with Session(engine) as session:
+            job_id = session.execute(
+                update(Job)
+                .where(Job.id == next_job, Job.status == "queued")
+                .values(
+                    status="running",
+                    attempts=Job.attempts + 1,
+                    updated_at=datetime.utcnow(),
+                )
+                .returning(Job.id)
+            ).scalar()
+            session.commit()
+            if job_id is None:
+                return None
+            return session.get(Job, job_id)
+
+    def _save(self, job: Job, **changes):
+        with Session(engine) as session:
+            job = session.get(Job, job.id)
+            for key, value in changes.items():
+                setattr(job, key, value)
+            job.updated_at = datetime.utcnow()
+            session.add(job)
+            session.commit()
+            session.refresh(job)
+            return job
+
+    def _finish(self, job: Job):
+        for callback in self._listeners:
+            try:
+                callback(job)
+            except Exception as e:
+                logger.error("Listener failed for job %s: %s", job.id, e)
+        if job.callback_url:
+            import requests
+
+            try:
+                requests.post(
+                    job.callback_url,
+                    json=self.describe(job),
+                    timeout=JOB_CALLBACK_TIMEOUT,
+                )
+            except requests.RequestException as e:
+                logger.warning("Callback to %s failed: %s", job.callback_url, e)
+
+    def run_job(self, job: Job):
+        from web3.exceptions import ContractLogicError
+
+        submit, owner_key = JOB_HANDLERS[job.kind]
+        payload = json.loads(job.payload)
+        try:
+            tx_hash = job.tx_hash
+            if not tx_hash:
+                tx_hash = submit(**payload).hex()
+                job = self._save(job, tx_hash=tx_hash)
+            receipt = utils.w3.eth.wait_for_transaction_receipt(
+                tx_hash, timeout=JOB_RECEIPT_TIMEOUT
+            )
+        except ContractLogicError as e:
+            # Reverted during gas estimation, retrying will not help
+            job = self._save(job, status="failed", error=str(e))
+        except Exception as e:
+            # Retry later; a stored tx hash means the next attempt only waits for
+            # the receipt instead of sending the transaction twice
+            status = "queued" if job.attempts < JOB_MAX_ATTEMPTS else "failed"
+            job = self._save(job, status=status, error=str(e))
+        else:
+            if owner_key:
+                utils.did_cache.invalidate(payload[owner_key].lower())
+            job = self._save(
+                job,
+                status="succeeded" if receipt["status"] == 1 else "failed",
+                block_number=receipt["blockNumber"],
+                receipt_status=receipt["status"],
+                error=None if receipt["status"] == 1 else "Transaction reverted",
+            )
+
+        if job.status in ("succeeded", "failed"):
+            self._finish(job)
+        return job
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                job = self._claim()
+            except Exception as e:
+                logger.error("Error claiming job: %s", e)
+                job = None
+            if job is None:
+                if time.monotonic() - self._recovered_at >= JOB_LEASE:
+                    try:
+                        self.recover()
+                    except Exception as e:
+                        logger.error("Error recovering jobs: %s", e)
+                self._wakeup.wait(JOB_POLL_INTERVAL)
+                self._wakeup.clear()
+                continue
+            self.run_job(job)
+
+    def recover(self):
+        """
+        Requeue `running` jobs not updated within JOB_LEASE, whose worker died.
+        Jobs a live worker (of any process) is running are left alone.
+        """
+        cutoff = datetime.utcnow() - timedelta(seconds=JOB_LEASE)
+        with Session(engine) as session:
+            result = session.execute(
+                update(Job)
+                .where(Job.status == "running", Job.updated_at < cutoff)
+                .values(status="queued", updated_at=datetime.utcnow())
+            )
+            session.commit()
+        self._recovered_at = time.monotonic()
+        if result.rowcount:
+            logger.warning("Requeued %d stalled jobs", result.rowcount)
+        return result.rowcount
+
+    def start(self):
+        if self._threads:
+            return
+        self.recover()
+        self._stop.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(
+                target=self._run, name=f"job-worker-{i}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+        self.notify()
+        for thread in self._threads:
+            thread.join(timeout=JOB_POLL_INTERVAL + 1)
+        self._threads = []
+
+
+job_queue = JobQueue()
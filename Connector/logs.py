@@ -0,0 +1,155 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_LEVEL = os.getenv("CONNECTOR_LOG_LEVEL", "INFO").upper()
+# Per-module overrides, e.g. "jobs=DEBUG,indexer=WARNING,uvicorn.access=WARNING"
+LOG_LEVELS = os.getenv("CONNECTOR_LOG_LEVELS", "")
+# "text" or "json" (one object per line)
+LOG_FORMAT = os.getenv("CONNECTOR_LOG_FORMAT", "text")
+# Empty disables the file
+LOG_FILE = os.getenv("CONNECTOR_LOG_FILE", "app.log")
+LOG_MAX_BYTES = int(os.getenv("CONNECTOR_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUPS = int(os.getenv("CONNECTOR_LOG_BACKUPS", "5"))
+LOG_CONSOLE = os.getenv("CONNECTOR_LOG_CONSOLE", "1") == "1"
+# Keep one in N DEBUG records per call site; 1 keeps them all
+LOG_DEBUG_SAMPLE = int(os.getenv("CONNECTOR_LOG_DEBUG_SAMPLE", "1"))
+# Records waiting for the writer thread; more than this are dropped, not waited on
+LOG_QUEUE_SIZE = int(os.getenv("CONNECTOR_LOG_QUEUE_SIZE", "10000"))
+
+TEXT_FORMAT = "%(asctime)s - %(levelname)s - %(name)s - %(message)s"
+
+# Attributes every LogRecord has; anything else came in through `extra=`
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class DebugSampler(logging.Filter):
+    """
+    Lets through one in `rate` DEBUG records per call site, so a chatty debug
+    line on a hot path cannot flood the queue. Other levels always pass.
+    """
+
+    def __init__(self, rate: int = LOG_DEBUG_SAMPLE):
+        super().__init__()
+        self.rate = max(rate, 1)
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno != logging.DEBUG or self.rate == 1:
+            return True
+        site = (record.pathname, record.lineno)
+        with self._lock:
+            count = self._counts.get(site, 0)
+            self._counts[site] = count + 1
+        return count % self.rate == 0
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    QueueHandler that never blocks the caller: when the writer thread falls
+    behind and the queue is full, records are counted and dropped.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_listener = None
+_queue_handler = None
+
+
+def make_handlers():
+    formatter = (
+        JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT)
+    )
+    handlers = []
+    if LOG_CONSOLE:
+        handlers.append(logging.StreamHandler(sys.stdout))
+    if LOG_FILE:
+        handlers.append(
+            RotatingFileHandler(
+                LOG_FILE,
+                maxBytes=LOG_MAX_BYTES,
+                backupCount=LOG_BACKUPS,
+                encoding="utf-8",
+            )
+        )
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    return handlers
+
+
+def setup_logging():
+    """
+    Route the root logger through a queue: callers only enqueue the record and
+    a listener thread formats and writes it to the console and app.log.
+    Safe to call more than once.
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+
+    _queue_handler = DroppingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    _queue_handler.addFilter(DebugSampler())
+
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    root.addHandler(_queue_handler)
+    for item in LOG_LEVELS.split(","):
+        if "=" in item:
+            name, level = item.split("=", 1)
+            logging.getLogger(name.strip()).setLevel(level.strip().upper())
+
+    _listener = QueueListener(_queue_handler.queue, *make_handlers())
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """
+    Write out the queued records and stop the listener thread.
+    """
+    global _listener, _queue_handler
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    logging.getLogger().removeHandler(_queue_handler)
+    _listener = None
+    _queue_handler = None
+
+
+def dropped_records() -> int:
+    return _queue_handler.dropped if _queue_handler else 0
@@ -1,37 +1,91 @@
+import asyncio
+import logging
+import os
 import secrets
+import time
 from datetime import datetime, timedelta
-from typing import Annotated, Dict
+from typing import Annotated, Dict, Literal
 
+import aiohttp
 import fastapi
+import requests
 from eth_typing import HexStr
-from fastapi import Depends, FastAPI, HTTPException, status
+from fastapi import Depends, FastAPI, HTTPException, Query, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.params import Depends
 from fastapi.requests import Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from passlib.context import CryptContext
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from sqlmodel import Session, SQLModel, create_engine, select
-from web3 import Web3
-from web3.exceptions import ContractLogicError
-
-from model import SignRequest, Token, User, VerifyRequest
+from sqlmodel import Session, select, update
+from starlette.concurrency import run_in_threadpool
+from web3.exceptions import ContractLogicError, TimeExhausted, Web3Exception
+
+from account_pool import account_pool
+from async_chain import (
+    async_get_did,
+    close_batch_session,
+    is_address,
+    resolve_dids_batch,
+)
+from challenge_store import challenge_store
+from database import engine, get_db, run_db, save
+from indexer import (
+    INDEXER_ENABLED,
+    chain_indexer,
+    get_indexed_credentials,
+    get_indexed_did,
+    verify_indexed_credential,
+)
+from jobs import job_queue
+from logs import setup_logging
+from metrics import MetricsMiddleware, render_metrics
+from migrations import run_migrations
+from passwords import password_hasher
+from presence import presence_tracker
+from model import (
+    Job,
+    LoginRequest,
+    RegisterRequest,
+    ResolveDIDsRequest,
+    SignRequest,
+    Token,
+    TokenRequest,
+    User,
+    UserUpdate,
+    VerifyBatchRequest,
+)
+from signatures import signature_verifier
+from startup import WARMUP, StartupProfile, warm_up
+from tokens import token_validator
+from user_import import IMPORT_BATCH_SIZE, detect_format, import_users, spool_upload
+from users import (
+    PRIVATE_FIELDS,
+    USERS_MAX_PAGE_SIZE,
+    USERS_PAGE_SIZE,
+    export_bounds,
+    export_users,
+    list_users,
+    parse_fields,
+    stream_users,
+)
 from utils import (
     ALGORITHM,
     SECRET_KEY,
-    generate_public_key,
-    get_accounts,
+    did_cache,
+    did_event_subscriber,
     get_did,
     get_loaded_accounts,
     initialize_contract,
+    make_did,
     print_user,
-    register_did,
-    revoke_did,
-    verify_signature,
 )
 
+setup_logging()
+logger = logging.getLogger(__name__)
+
 # CORS Configuration
 origins = ["*"]  # Allow all origins for now
 
@@ -41,7 +95,9 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 
 # FastAPI setup
-app = fastapi.FastAPI()
+# Bodies are parsed into the typed models of model.py and responses are
+# serialized with orjson
+app = fastapi.FastAPI(default_response_class=ORJSONResponse)
 
 # CORS Middleware
 app.add_middleware(
@@ -50,38 +106,54 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Pagination cursor of /api/users
+    expose_headers=["X-Next-Cursor"],
 )
+app.add_middleware(MetricsMiddleware)
 
-# Web3 setup
-w3 = Web3(Web3.HTTPProvider("http://127.0.0.1:8545"))  # Hardhat testnet
-
-# Database setup
-sqlite_file_name = "./awais_database.db"
-sqlite_url = f"sqlite:///{sqlite_file_name}"
-connect_args = {"check_same_thread": False}
-engine = create_engine(sqlite_url, connect_args=connect_args)
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Route chain calls through AsyncWeb3 instead of blocking the event loop
+USE_ASYNC_WEB3 = os.getenv("CONNECTOR_ASYNC_WEB3", "1") == "1"
 
 
-def create_db_and_tables():
-    SQLModel.metadata.create_all(engine)
-
+@app.on_event("startup")
+async def on_startup():
+    profile = StartupProfile()
+    with profile.phase("migrations"):
+        run_migrations()
+    with profile.phase("account pool"):
+        with Session(engine) as session:
+            account_pool.load(session)
+    if WARMUP:
+        await warm_up(USE_ASYNC_WEB3, profile)
+    with profile.phase("background threads"):
+        did_event_subscriber.start()
+        job_queue.start()
+        presence_tracker.start()
+        if INDEXER_ENABLED:
+            chain_indexer.start()
+    profile.report()
 
-def get_session():
-    with Session(engine) as session:
-        yield session
 
+@app.on_event("shutdown")
+async def on_shutdown():
+    did_event_subscriber.stop()
+    job_queue.stop()
+    presence_tracker.stop()
+    chain_indexer.stop()
+    signature_verifier.shutdown()
+    password_hasher.shutdown()
+    await close_batch_session()
 
-@app.on_event("startup")
-def on_startup():
-    create_db_and_tables()
 
+# A sync Session or an AsyncSession depending on CONNECTOR_DATABASE_ASYNC, queries
+# go through run_db()
+SessionDep = Annotated[Session, Depends(get_db)]
 
-SessionDep = Annotated[Session, Depends(get_session)]
 
-# In-memory storage for challenges
-challenges = {}
+async def resolve_did(address: str):
+    if USE_ASYNC_WEB3:
+        return await async_get_did(address)
+    return get_did(address)
 
 
 @app.get("/")
@@ -89,6 +161,13 @@ async def read_root():
     return {"Connector": "Running!"}
 
 
+@app.get("/metrics")
+async def get_metrics():
+    # Prometheus text format
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
 """
 ##############################################
 ############### PROFILE ROUTES ###############
@@ -97,26 +176,26 @@ async def read_root():
 
 
 @app.post("/api/profile/")
-async def get_user_profile(request: Request, session: SessionDep):
+async def get_user_profile(request: TokenRequest, session: SessionDep):
     # Assume since the user is logged in, the token is valid
-    body = await request.json()
-    token = body.get("token")
-    print(f"token: {token}")
+    token = request.token
 
     # Get the user from the database based on the token
-    with Session(engine) as session:
-        statement = select(User).where(User.access_token == token)
-        user = session.exec(statement).first()
+    try:
+        user = await run_db(session, token_validator.resolve_user, token)
+    except JWTError:
+        user = None
+    if not user:
+        raise HTTPException(status_code=401, detail="Token is invalid or expired")
 
-    print(f"IN USER PROFILE")
     # Get the DID from the blockchain
-    print(f"User Address: {user.blockchain_address}")
+    logger.debug("Profile of user %s, address %s", user.id, user.blockchain_address)
     did = "Couldnt find from Blockchain"
     if user.isPWLess:
-        did = get_did(HexStr(user.blockchain_address))
+        did = await resolve_did(HexStr(user.blockchain_address))
     else:
         did = "Passwordless not enabled"
-    print(f"User DID: {did}")
+    logger.debug("User DID: %s", did)
 
     # Load user profile into User Object
     user = {
@@ -132,13 +211,61 @@ async def get_user_profile(request: Request, session: SessionDep):
         ),
         "role": user.role,
         "isPWLess": user.isPWLess,
-        "isOnline": user.isOnline,
+        "isOnline": presence_tracker.is_online(user.id),
         "did": did if user.isPWLess else "Passwordless not enabled",
     }
 
-    print(user)
+    return ORJSONResponse(status_code=200, content=user)
+
+
+@app.post("/api/dids/resolve")
+async def resolve_dids(request: ResolveDIDsRequest):
+    results = await resolve_dids_batch(request.addresses)
+    return {"results": results}
 
-    return JSONResponse(status_code=200, content=user)
+
+@app.get("/api/dids/cache")
+async def get_did_cache_stats():
+    return did_cache.stats()
+
+
+"""
+##############################################
+########### LOCAL CHAIN INDEX ROUTES #########
+##############################################
+"""
+
+
+@app.get("/api/index/status")
+async def get_index_status():
+    return chain_indexer.status()
+
+
+@app.get("/api/index/dids/{address}")
+async def get_index_did(address: str, session: SessionDep):
+    did = await run_db(session, get_indexed_did, address)
+    if not did:
+        raise HTTPException(status_code=404, detail="DID not found")
+    return did
+
+
+@app.get("/api/index/credentials")
+async def get_index_credentials(
+    session: SessionDep, holder: str | None = None, credential_hash: str | None = None
+):
+    if not holder and not credential_hash:
+        raise HTTPException(
+            status_code=400, detail="Provide a holder and/or a credential_hash."
+        )
+    return await run_db(session, get_indexed_credentials, holder, credential_hash)
+
+
+@app.get("/api/index/credentials/verify")
+async def verify_index_credential(
+    holder: str, credential_hash: str, session: SessionDep
+):
+    valid = await run_db(session, verify_indexed_credential, holder, credential_hash)
+    return {"valid": valid}
 
 
 """
@@ -149,107 +276,207 @@ async def get_user_profile(request: Request, session: SessionDep):
 
 
 @app.get("/api/users")
-async def get_all_users(session: SessionDep):
-    users = session.exec(select(User)).all()
-    return users
+async def get_all_users(
+    session: SessionDep,
+    cursor: int | None = None,
+    limit: int = Query(USERS_PAGE_SIZE, ge=1, le=USERS_MAX_PAGE_SIZE),
+    fields: str | None = None,
+    format: Literal["json", "ndjson"] = "json",
+):
+    """
+    List users ordered by id, without credentials. `fields` is a comma separated
+    projection. JSON responses hold one page of `limit` users and the cursor of
+    the next page in the X-Next-Cursor header; `format=ndjson` streams every user
+    after `cursor` instead.
+    """
+    try:
+        columns = parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
+    if format == "ndjson":
+        return StreamingResponse(
+            stream_users(columns, cursor), media_type="application/x-ndjson"
+        )
 
-@app.get("/api/users/active")
-async def get_active_users(session: SessionDep):
-    active_users_count = len(
-        session.exec(select(User).where(User.isOnline == True)).all()
+    users, next_cursor = await run_db(session, list_users, columns, cursor, limit)
+    headers = {"X-Next-Cursor": str(next_cursor)} if next_cursor else None
+    return ORJSONResponse(content=users, headers=headers)
+
+
+@app.get("/api/users/export")
+async def export_users_route(session: SessionDep, cursor: str | None = None):
+    """
+    Stream every user (without credentials) with the DID the registry holds for
+    their address, as NDJSON. Each line has a `cursor`; pass the last one
+    received to resume an interrupted export where it stopped.
+    """
+    try:
+        after, until = await run_db(session, export_bounds, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(
+        export_users(after, until), media_type="application/x-ndjson"
     )
-    return {"active_users": active_users_count}
+
+
+@app.post("/api/users/import")
+async def import_users_route(
+    request: Request,
+    format: Literal["csv", "ndjson"] | None = None,
+    passwordless: bool = False,
+    batch_size: int = Query(IMPORT_BATCH_SIZE, ge=1, le=5000),
+):
+    """
+    Bulk import users from a CSV or NDJSON request body (the format comes from
+    `format` or else the content type), with the register route's fields per
+    row. The body is buffered, then imported in batches off the event loop;
+    the report counts every row and lists the rows that were not imported.
+    Large files are better imported with `python cli.py import-users`.
+    """
+    upload = await spool_upload(request.stream())
+    format = format or detect_format(request.headers.get("content-type"))
+    try:
+        return await run_in_threadpool(
+            import_users, upload, format, passwordless, batch_size
+        )
+    except UnicodeDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"Body is not UTF-8: {e}")
+    finally:
+        upload.close()
+
+
+@app.get("/api/users/active")
+async def get_active_users():
+    return {"active_users": presence_tracker.count()}
+
+
+@app.get("/api/accounts/pool")
+async def get_account_pool_stats(session: SessionDep):
+    return await run_db(session, account_pool.stats)
 
 
 @app.delete("/api/users/{user_id}")
 async def delete_user(user_id: int, session: SessionDep):
-    user = session.get(User, user_id)
-    if not user:
-        return HTTPException(status_code=404, detail="User not found")
-    session.delete(user)
-    session.commit()
+    def delete(session):
+        user = session.get(User, user_id)
+        if not user:
+            return None
+        account_pool.release(session, user_id)
+        token_validator.revoke_subject(user.email, session=session)
+        session.delete(user)
+        session.commit()
+        return user
+
+    if not await run_db(session, delete):
+        raise HTTPException(status_code=404, detail="User not found")
+    presence_tracker.remove(user_id)
     return {"success": True}
 
 
 @app.put("/api/users/{user_id}")
-async def update_user(user_id: int, user_data: dict, session: SessionDep):
+async def update_user(user_id: int, update_data: UserUpdate, session: SessionDep):
     """
     Update a user's information based on the user_id and the new data provided in the request body.
     """
     # Fetch user from the database
-    user = session.get(User, user_id)
+    user = await run_db(session, lambda s: s.get(User, user_id))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    print(f"Updating user ({user.email})")
-    print(f"Changes:")
+    logger.info("Updating user %s (%s)", user.id, user.email)
 
-    # Update user attributes based on the user_data
+    # Update user attributes based on the fields sent
+    user_data = update_data.model_dump(exclude_unset=True)
+    callback_url = user_data.pop("callback_url", None)
     for key, value in user_data.items():
         if hasattr(user, key):  # Only update valid attributes
             old_value = getattr(user, key)
             setattr(user, key, value)
-            if old_value != value:
-                print(f"  {key}: {old_value} -> {value}")
-
-    # If the user is passwordless, generate keys
-    if user.isPWLess:
-        print(f"Checking if any address is available")
-
-        accounts = get_accounts()
-        address = None
-        private_key = None
-
-        # Get the list of existing users with blockchain addresses
-        users_in_db = session.exec(select(User)).all()
-
-        for account in accounts:
-            # Ensure the address is not already in use
-            if account["account"] not in [
-                user.blockchain_address for user in users_in_db
-            ]:
-                address = account["account"]
-                private_key = account["privateKey"]
-                break
-
-        if not address:
-            return {"success": False, "error": "No available accounts."}
-
-        # Generate the public key from the private key
-        public_key = generate_public_key(private_key, isBase64=False, isPEM=False)
-
-        # Register DID
-        did = f"did:key:{address[2:]}"
-        print(f"Checking if DID exists: {did}")
-        try:
-            get_did(address=HexStr(address))
-        except ContractLogicError or ValueError as e:
-            print(f"Error: {e}")
-            print(f"Registering DID: {did}")
-            register_did(address=address, did=did)
-        # Update user blockchain-related fields
-        user.did = did
-        user.blockchain_address = address
-        user.private_key = private_key
-        user.public_key = public_key
-
-        print(
-            f"SUCCESS! Generated:\n Address: {address}\n Private Key: {private_key}\n Public Key: {public_key}\n DID: {did}"
-        )
-
-    elif not user.isPWLess:
-        # Clear blockchain-related fields if not passwordless
-        user.public_key = None
-        user.private_key = None
-        user.blockchain_address = None
-
-    # Add and commit the changes to the database
-    session.add(user)
-    session.commit()  # Ensure changes are committed to DB
-    session.refresh(user)  # Refresh the user object to get the latest data from DB
+            if old_value != value and key in PRIVATE_FIELDS:
+                logger.info("  %s changed", key)
+            elif old_value != value:
+                logger.info("  %s: %s -> %s", key, old_value, value)
 
-    return {"success": True, "user": user}
+    job_id = None
+    claimed = False
+    try:
+        # If the user is passwordless, generate keys
+        if user.isPWLess:
+            logger.debug("Checking if any address is available")
+
+            # Keeps the user's current account, or claims the next free one. The
+            # claim commits on its own so no write lock is held over the DID check
+            account, claimed = await run_in_threadpool(account_pool.claim, user.id)
+            if not account:
+                return {"success": False, "error": "No available accounts."}
+            # Derived when the pool was loaded
+            address, public_key = account_pool.keys(account)
+            private_key = account.private_key
+
+            # Register DID in the background, the admin gets the job id to poll
+            did = make_did(address)
+            logger.debug("Checking if DID exists: %s", did)
+            try:
+                await resolve_did(HexStr(address))
+            except (ContractLogicError, ValueError) as e:
+                logger.info("Queueing DID registration of %s: %s", did, e)
+                job = await run_db(
+                    session,
+                    lambda s: job_queue.enqueue(
+                        "register_did",
+                        {"address": address, "did": did},
+                        callback_url=callback_url,
+                        session=s,
+                    ),
+                )
+                job_id = job.id
+            except (asyncio.TimeoutError, TimeExhausted, requests.Timeout) as e:
+                logger.error("Timed out checking DID %s: %s", did, e)
+                raise HTTPException(
+                    status_code=504, detail="Timed out checking the DID."
+                )
+            except (Web3Exception, aiohttp.ClientError, requests.RequestException) as e:
+                logger.error("Error checking DID %s: %s", did, e)
+                raise HTTPException(
+                    status_code=503, detail="Blockchain node unavailable."
+                )
+            # Update user blockchain-related fields
+            user.did = did
+            user.blockchain_address = address
+            user.private_key = private_key
+            user.public_key = public_key
+
+            logger.info("Assigned %s (%s) to user %s", address, did, user.id)
+
+        elif not user.isPWLess:
+            # Clear blockchain-related fields if not passwordless
+            await run_db(session, account_pool.release, user.id)
+            user.public_key = None
+            user.private_key = None
+            user.blockchain_address = None
+
+        # Add and commit the changes to the database
+        await run_db(session, save, user)  # Ensure changes are committed to DB
+    except Exception:
+        if claimed:
+            # Nothing refers to the account yet; end our transaction first so
+            # the release does not wait on its write lock
+            await run_db(session, lambda s: s.rollback())
+            await run_in_threadpool(account_pool.unclaim, user.id)
+        raise
+    if job_id:
+        job_queue.notify()
+
+    return {"success": True, "user": user, "job_id": job_id}
+
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: int, session: SessionDep):
+    job = await run_db(session, lambda s: s.get(Job, job_id))
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_queue.describe(job)
 
 
 """
@@ -261,9 +488,9 @@ async def update_user(user_id: int, user_data: dict, session: SessionDep):
 
 def verify_token(token: str = Depends(oauth2_scheme)):
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = token_validator.decode(token)
         email: str = payload.get("sub")
-        print(f"[VRFY_TKN] TOKEN email: {email}")
+        logger.debug("Token of %s", email)
         if email is None:
             raise HTTPException(status_code=403, detail="Token is invalid or expired")
         return email
@@ -272,37 +499,64 @@ def verify_token(token: str = Depends(oauth2_scheme)):
 
 
 @app.post("/verify-token")
-async def verify_user_token(request: Request):
+async def verify_user_token(request: TokenRequest, session: SessionDep):
     try:
-        body = await request.json()
-        print(f"[VRFY_TKN] Body: {body}")
-        token = body.get("token")
-        print(f"Verifying token: {token}")
-        email = verify_token(token=token)
-        # Set the rest of the users to offline
-        with Session(engine) as session:
-            statement = select(User).where(User.email != email)
-            users = session.exec(statement).all()
-            for user in users:
-                user.isOnline = False
-                session.add(user)
+        token = request.token
+        # Decoding may reload the revocations from the database
+        email = await run_in_threadpool(verify_token, token)
+
+        # Store the token if it changed; being online is tracked in memory
+        def store_token(session):
+            user = session.exec(
+                select(User.id, User.access_token).where(User.email == email)
+            ).first()
+            if not user:
+                raise ValueError(f"User {email} not found")
+            if user.access_token != token:
+                session.execute(
+                    update(User).where(User.id == user.id).values(access_token=token)
+                )
                 session.commit()
-                session.refresh(user)
+            return user.id
 
-        # Set Token in the DB
-        with Session(engine) as session:
-            statement = select(User).where(User.email == email)
-            user = session.exec(statement).first()
-            user.access_token = token
-            user.isOnline = True
-            session.add(user)
-            session.commit()
-            session.refresh(user)
-
-        return JSONResponse(status_code=200, content="Token is valid")
+        presence_tracker.touch(await run_db(session, store_token))
+
+        return ORJSONResponse(status_code=200, content="Token is valid")
     except Exception as e:
-        print(e)
-        return JSONResponse(status_code=400, content="Error verifying token.")
+        logger.info("Token verification failed: %s", e)
+        return ORJSONResponse(status_code=400, content="Error verifying token.")
+
+
+@app.post("/api/auth/logout")
+async def logout(request: TokenRequest, session: SessionDep):
+    token = request.token
+    try:
+        user = await run_db(session, token_validator.resolve_user, token)
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Token is invalid or expired")
+
+    await run_in_threadpool(token_validator.revoke, token)
+    if user:
+        presence_tracker.remove(user.id)
+        if user.access_token == token:
+            user.access_token = None
+            await run_db(session, save, user)
+    return {"success": True}
+
+
+@app.post("/api/presence/heartbeat")
+async def heartbeat(request: TokenRequest, session: SessionDep):
+    """
+    Keep the token's user online for another PRESENCE_TTL seconds. Clients send
+    this periodically while a page is open.
+    """
+    try:
+        user_id = await run_db(session, token_validator.resolve_user_id, request.token)
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Token is invalid or expired")
+    if user_id is None:
+        raise HTTPException(status_code=401, detail="Token is invalid or expired")
+    return {"online": True, "expires_in": presence_tracker.touch(user_id)}
 
 
 # Helper function to create the JWT token
@@ -312,22 +566,24 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=60)
-    to_encode.update({"exp": expire})
+    # iat lets every token of a user be revoked at once (revoke_subject). Kept
+    # to the microsecond like the revocation time, a whole second would revoke
+    # tokens issued just after it in the same second
+    to_encode.update({"exp": expire, "iat": time.time()})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 
 @app.post("/token", response_model=Token)
-async def login_for_access_token(request: Request, db: Session = Depends(get_session)):
-
-    # Grab the role from the request body
-    body = await request.json()
-    role = body.get("email").split("@")[1].split(".")[0]
-
+async def login_for_access_token(request: LoginRequest, db: SessionDep):
     # Use the existing `verify_password` function for user authentication
-    authentication_result = await verify_password(request, db)
+    authentication_result = await verify_password(request.email, request.password, db)
 
-    print(f"Authentication Result: {authentication_result}")
+    logger.info(
+        "Login %s for %s",
+        "succeeded" if authentication_result.get("authenticated") else "failed",
+        request.email,
+    )
 
     if not authentication_result.get("authenticated"):
         raise HTTPException(
@@ -337,45 +593,47 @@ async def login_for_access_token(request: Request, db: Session = Depends(get_ses
         )
 
     # If authentication is successful, return the token
-    return JSONResponse(
+    return ORJSONResponse(
         content={
             "access_token": authentication_result["access_token"],
-            "role": role,
+            "role": authentication_result["role"],
             "token_type": "bearer",
         }
     )
 
 
 # Function to verify password and authenticate user
-async def verify_password(request: Request, db: Session) -> Dict:
-    body = await request.json()
-    email = body.get("email")
-    password = body.get("password")
-
-    print(f"[VRFY_PW] Body: {body}")
+async def verify_password(email: str, password: str, db: Session) -> Dict:
+    logger.debug("Password login attempt for %s", email)
 
     if not email or not password:
         return {"authenticated": False, "error": "Missing email or password in BODY"}
 
     # Query user from the database
     statement = select(User).where(User.email == email)
-    user = db.exec(statement).first()
+    user = await run_db(db, lambda s: s.exec(statement).first())
 
     # If user not found or password is incorrect, return error
-    if not user or password != user.password_hash:
+    valid, new_hash = await password_hasher.verify(
+        password, user.password_hash if user else None
+    )
+    if not valid:
         return {"authenticated": False, "error": "Invalid email or password"}
 
-    # if not user or not pwd_context.verify(
-    #     password, user.password_hash
-    # ):  # Use bcrypt to verify password hash
-    #     return {"authenticated": False, "error": "Invalid email or password"}
+    # Plaintext passwords and hashes of a lower cost are replaced on login
+    if new_hash:
+        user.password_hash = new_hash
+        await run_db(db, save, user)
+        logger.info("Rehashed password of user %s", user.id)
 
     role = email.split("@")[1].split(".")[0]
     if role not in ["admin", "user"]:
         role = "user"
 
     # Generate JWT token
-    access_token = create_access_token(data={"sub": user.email, "role": role})
+    access_token = create_access_token(
+        data={"sub": user.email, "uid": user.id, "role": role}
+    )
 
     return {
         "authenticated": True,
@@ -385,24 +643,19 @@ async def verify_password(request: Request, db: Session) -> Dict:
 
 
 @app.post("/api/auth/password/register")
-async def register_user(request: Request):
+async def register_user(request: RegisterRequest, session: SessionDep):
     try:
-        body = await request.json()
-        username = body.get("username")
-        email = body.get("email")
-        phoneNumber = body.get("phone")
-        role = body.get("role")
-        password = body.get("password")
-        isPWLess = body.get("isPWLess", False)
-
-        print(
-            f"Got in Body:\n Username: {username}\n Email: {email}\n Phone: {phoneNumber}\n Role: {role}\n Password: {password}\n isPWLess: {isPWLess}"
-        )
+        username = request.username
+        email = request.email
+        phoneNumber = request.phone
+        role = request.role
+        password = request.password
+
+        logger.info("Registering user %s (%s)", username, email)
 
         # Check if user already exists, then return error
-        with Session(engine) as session:
-            statement = select(User).where(User.email == email)
-            user = session.exec(statement).first()
+        statement = select(User).where(User.email == email)
+        user = await run_db(session, lambda s: s.exec(statement).first())
 
         if user:
             return {"success": False, "error": "User already exists."}
@@ -411,7 +664,7 @@ async def register_user(request: Request):
             username=username,
             email=email,
             phone=phoneNumber,
-            password_hash=password,
+            password_hash=await password_hasher.hash(password),
             role=role,
             isPWLess=False,  # Only enable passwordless when user triggers it
             isOnline=False,
@@ -419,18 +672,19 @@ async def register_user(request: Request):
 
         print_user(user)
         try:
-            with Session(engine) as session:
-                session.add(user)
-                session.commit()
-                session.refresh(user)
+            await run_db(session, save, user)
+        except IntegrityError:
+            # Registered by a concurrent request while the password was hashed
+            await run_db(session, lambda s: s.rollback())
+            return {"success": False, "error": "User already exists."}
         except Exception as e:
-            print(e)
-            return JSONResponse(status_code=400, content="Error registering user.")
+            logger.error("Error registering user %s: %s", email, e)
+            return ORJSONResponse(status_code=400, content="Error registering user.")
 
         return {"success": True}
     except Exception as e:
-        print(e)
-        return JSONResponse(status_code=400, content="Error registering user.")
+        logger.error("Error registering user: %s", e)
+        return ORJSONResponse(status_code=400, content="Error registering user.")
 
 
 """
@@ -442,71 +696,51 @@ async def register_user(request: Request):
 
 @app.get("/api/auth/PKI/challenge")
 async def get_challenge(address: str):
-    if not w3.is_address(address):
+    if not is_address(address):
         raise HTTPException(status_code=400, detail="Invalid Ethereum address.")
 
     # Generate a random challenge for the user
     challenge = secrets.token_hex(32)
-    challenges[address] = challenge
-    print(f"Generated challenge for {address}: {challenge}")
+    await run_in_threadpool(challenge_store.put, address, challenge)
+    logger.debug("Generated challenge for %s", address)
     return {"message": challenge}
 
 
-# Helper function to verify the signature (updated to work with message hash and Ethereum prefix)
-def verify_signature(message: str, signature: str, address: str, web3: Web3) -> bool:
-    try:
-        # Ensure the message is a hex string, if not, raise an error
-        if message.startswith("0x"):
-            message_bytes = bytes.fromhex(
-                message[2:]
-            )  # Convert from hex to bytes (ignore '0x')
-        else:
-            # If it's a string message, encode it as bytes
-            message_bytes = message.encode("utf-8")
-
-        # Step 1: Hash the message
-        message_hash = web3.solidity_keccak(
-            ["bytes"], [message_bytes]
-        )  # keccak256 of the message
-
-        # Step 2: Prefix the message hash with the Ethereum message prefix
-        prefix = f"\x19Ethereum Signed Message:\n{len(message)}".encode("utf-8")
-        prefixed_hash = web3.solidity_keccak(
-            ["bytes", "bytes"], [prefix, message_bytes]
-        )
-
-        # Step 3: Recover the address from the signature
-        recovered_address = web3.eth.account._recover_hash(
-            prefixed_hash, signature=signature
-        )
-
-        # Step 4: Compare the recovered address with the provided address
-        return recovered_address.lower() == address.lower()
-    except Exception as e:
-        print(f"Error: {e}")
-        return False
+@app.post("/api/auth/PKI/sign")
+async def sign_message(request: SignRequest):
+    address = request.address
+    message = request.message
+    signature = request.signature
 
+    logger.debug("Verifying signature of %s", address)
 
-@app.post("/api/auth/PKI/sign")
-async def sign_message(request: Request):
-    body = await request.json()
-    address = body.get("address")
-    message = body.get("message")
-    originalMessage = challenges.get(address)  # This is the original challenge message
-    signature = body.get("signature")
-
-    print(f"Original Message: {originalMessage} {type(originalMessage)}")
-    print(f"Message:          {message} {type(message)}")
-    print(f"Message Length: {len(message)}")
-    print(f"Signature: {signature}")
-
-    if not message or message != originalMessage:
+    # Challenges are single use: a failed attempt needs a fresh challenge
+    if not address or not message:
+        raise HTTPException(status_code=400, detail="Invalid challenge or address.")
+    if not await run_in_threadpool(challenge_store.consume, address, message):
         raise HTTPException(status_code=400, detail="Invalid challenge or address.")
 
     # Verify the signature using the message hash with Ethereum prefix
-    is_valid = verify_signature(message, signature, address, w3)
+    is_valid = await signature_verifier.verify(message, signature, address)
 
     if not is_valid:
         raise HTTPException(status_code=400, detail="Invalid signature.")
 
     return {"authenticated": True, "message": "Signature is valid, user authenticated."}
+
+
+@app.post("/api/auth/PKI/verify-batch")
+async def verify_signature_batch(request: VerifyBatchRequest):
+    """
+    Verify many (address, message, signature) tuples in one call. This only
+    checks signatures, it does not consume challenges.
+    """
+    results = await signature_verifier.verify_many(
+        (item.address, item.message, item.signature) for item in request.items
+    )
+    return {
+        "results": [
+            {"address": item.address, "valid": valid}
+            for item, valid in zip(request.items, results)
+        ]
+    }
@@ -0,0 +1,224 @@
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client import multiprocess
+
+# Set (with PROMETHEUS_MULTIPROC_DIR) when running several uvicorn workers
+MULTIPROCESS = "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+REQUEST_LATENCY = Histogram(
+    "connector_http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "connector_http_requests_in_flight",
+    "HTTP requests being served",
+    ["method"],
+    multiprocess_mode="livesum",
+)
+RPC_LATENCY = Histogram(
+    "connector_rpc_duration_seconds",
+    "JSON-RPC call latency by method and contract function",
+    ["method", "function"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+RPC_ERRORS = Counter(
+    "connector_rpc_errors_total",
+    "Failed JSON-RPC calls by method, contract function and error",
+    ["method", "function", "error"],
+)
+DB_QUERY_LATENCY = Histogram(
+    "connector_db_query_duration_seconds",
+    "Database statement latency by statement type",
+    ["statement"],
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1, 0.5, 1),
+)
+OPERATION_LATENCY = Histogram(
+    "connector_operation_duration_seconds",
+    "Latency of CPU heavy operations (JWT decoding, password and signature checks)",
+    ["operation"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1),
+)
+
+# 4-byte selector (0x-prefixed hex) -> contract function name, for RPC labels
+FUNCTION_SELECTORS = {}
+# Methods whose first param is a transaction with contract call data
+_CALL_METHODS = {"eth_call", "eth_estimateGas", "eth_sendTransaction"}
+_STATEMENTS = {"select", "insert", "update", "delete"}
+
+
+def register_abi(abi):
+    """
+    Make calls to the functions of this ABI show up by name in the RPC metrics.
+    """
+    from eth_utils import function_abi_to_4byte_selector
+
+    for item in abi:
+        if item.get("type") == "function":
+            selector = "0x" + function_abi_to_4byte_selector(item).hex()
+            FUNCTION_SELECTORS[selector] = item["name"]
+
+
+def rpc_function(method: str, params) -> str:
+    if method in _CALL_METHODS and params and isinstance(params[0], dict):
+        data = params[0].get("data") or params[0].get("input")
+        if isinstance(data, bytes):
+            data = "0x" + data.hex()
+        if isinstance(data, str):
+            return FUNCTION_SELECTORS.get(data[:10].lower(), "unknown")
+    return ""
+
+
+def _observe_rpc(method, function, started, response=None, error=None):
+    RPC_LATENCY.labels(method, function).observe(time.perf_counter() - started)
+    if error is not None:
+        RPC_ERRORS.labels(method, function, type(error).__name__).inc()
+    elif isinstance(response, dict) and "error" in response:
+        RPC_ERRORS.labels(method, function, "rpc_error").inc()
+
+
+def rpc_metrics_middleware(make_request, w3):
+    """
+    web3 middleware timing every JSON-RPC request.
+    """
+
+    def middleware(method, params):
+        function = rpc_function(method, params)
+        started = time.perf_counter()
+        try:
+            response = make_request(method, params)
+        except Exception as e:
+            _observe_rpc(method, function, started, error=e)
+            raise
+        _observe_rpc(method, function, started, response)
+        return response
+
+    return middleware
+
+
+async def async_rpc_metrics_middleware(make_request, w3):
+    """
+    AsyncWeb3 version of rpc_metrics_middleware.
+    """
+
+    async def middleware(method, params):
+        function = rpc_function(method, params)
+        started = time.perf_counter()
+        try:
+            response = await make_request(method, params)
+        except Exception as e:
+            _observe_rpc(method, function, started, error=e)
+            raise
+        _observe_rpc(method, function, started, response)
+        return response
+
+    return middleware
+
+
+@contextmanager
+def observe_rpc(method: str, function: str = ""):
+    """
+    Time a JSON-RPC request that does not go through web3 (e.g. batches).
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        _observe_rpc(method, function, started, error=e)
+        raise
+    _observe_rpc(method, function, started)
+
+
+@contextmanager
+def timed(operation: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        OPERATION_LATENCY.labels(operation).observe(time.perf_counter() - started)
+
+
+def instrument_engine(engine):
+    """
+    Time every statement run on a SQLAlchemy engine (for async engines pass
+    `async_engine.sync_engine`).
+    """
+    from sqlalchemy import event
+
+    def before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    def after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        verb = statement.lstrip()[:6].lower()
+        DB_QUERY_LATENCY.labels(verb if verb in _STATEMENTS else "other").observe(
+            time.perf_counter() - started
+        )
+
+    def error(exception_context):
+        # The statement failed, drop its start time
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("query_started"):
+            conn.info["query_started"].pop()
+
+    event.listen(engine, "before_cursor_execute", before)
+    event.listen(engine, "after_cursor_execute", after)
+    event.listen(engine, "handle_error", error)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording latency per route template (so /api/users/1 and
+    /api/users/2 share a series) and the number of requests in flight.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        method = scope["method"]
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        in_flight = REQUESTS_IN_FLIGHT.labels(method)
+        in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_flight.dec()
+            # The router stores the matched route in the scope
+            route = scope.get("route")
+            REQUEST_LATENCY.labels(
+                method, route.path if route else "unmatched", str(status)
+            ).observe(time.perf_counter() - started)
+
+
+def render_metrics():
+    """
+    Return (body, content type) for the /metrics endpoint.
+    """
+    registry = REGISTRY
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,271 @@
+import logging
+from datetime import datetime
+
+from sqlalchemy import text
+
+from database import engine
+
+logger = logging.getLogger(__name__)
+
+
+# The schema as of the first versioned release. Frozen: later changes to
+# model.py need their own migration below. IF NOT EXISTS adopts databases
+# created before migrations existed. The user lookup indexes are migration 2.
+SCHEMA_V1 = [
+    """CREATE TABLE IF NOT EXISTS user (
+        id INTEGER NOT NULL,
+        username VARCHAR NOT NULL,
+        email VARCHAR NOT NULL,
+        phone VARCHAR NOT NULL,
+        password_hash VARCHAR NOT NULL,
+        public_key VARCHAR,
+        private_key VARCHAR,
+        blockchain_address VARCHAR,
+        role VARCHAR NOT NULL,
+        did VARCHAR,
+        access_token VARCHAR,
+        "isPWLess" BOOLEAN NOT NULL,
+        "isOnline" BOOLEAN NOT NULL,
+        PRIMARY KEY (id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS job (
+        id INTEGER NOT NULL,
+        kind VARCHAR NOT NULL,
+        payload VARCHAR NOT NULL,
+        status VARCHAR NOT NULL,
+        attempts INTEGER NOT NULL,
+        tx_hash VARCHAR,
+        block_number INTEGER,
+        receipt_status INTEGER,
+        error VARCHAR,
+        callback_url VARCHAR,
+        created_at DATETIME NOT NULL,
+        updated_at DATETIME NOT NULL,
+        PRIMARY KEY (id)
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_job_status ON job (status)",
+    """CREATE TABLE IF NOT EXISTS challenge (
+        address VARCHAR NOT NULL,
+        challenge VARCHAR NOT NULL,
+        expires_at FLOAT NOT NULL,
+        PRIMARY KEY (address)
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_challenge_expires_at ON challenge (expires_at)",
+    """CREATE TABLE IF NOT EXISTS revokedtoken (
+        token_hash VARCHAR NOT NULL,
+        expires_at FLOAT NOT NULL,
+        PRIMARY KEY (token_hash)
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_revokedtoken_expires_at "
+    "ON revokedtoken (expires_at)",
+    """CREATE TABLE IF NOT EXISTS poolaccount (
+        address VARCHAR NOT NULL,
+        private_key VARCHAR NOT NULL,
+        position INTEGER NOT NULL,
+        user_id INTEGER,
+        allocated_at DATETIME,
+        PRIMARY KEY (address)
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_poolaccount_user_id_position "
+    "ON poolaccount (user_id, position)",
+    """CREATE TABLE IF NOT EXISTS chainevent (
+        id INTEGER NOT NULL,
+        block_number INTEGER NOT NULL,
+        block_hash VARCHAR NOT NULL,
+        tx_hash VARCHAR NOT NULL,
+        log_index INTEGER NOT NULL,
+        event VARCHAR NOT NULL,
+        address VARCHAR NOT NULL,
+        issuer VARCHAR,
+        did VARCHAR,
+        credential_hash VARCHAR,
+        PRIMARY KEY (id),
+        UNIQUE (tx_hash, log_index)
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_chainevent_block_number "
+    "ON chainevent (block_number)",
+    "CREATE INDEX IF NOT EXISTS ix_chainevent_address ON chainevent (address)",
+    """CREATE TABLE IF NOT EXISTS indexeddid (
+        address VARCHAR NOT NULL,
+        did VARCHAR NOT NULL,
+        block_number INTEGER NOT NULL,
+        PRIMARY KEY (address)
+    )""",
+    """CREATE TABLE IF NOT EXISTS indexedcredential (
+        id INTEGER NOT NULL,
+        holder VARCHAR NOT NULL,
+        issuer VARCHAR NOT NULL,
+        credential_hash VARCHAR NOT NULL,
+        is_revoked BOOLEAN NOT NULL,
+        issued_block INTEGER NOT NULL,
+        revoked_block INTEGER,
+        PRIMARY KEY (id)
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_indexedcredential_holder "
+    "ON indexedcredential (holder)",
+    "CREATE INDEX IF NOT EXISTS ix_indexedcredential_credential_hash "
+    "ON indexedcredential (credential_hash)",
+    """CREATE TABLE IF NOT EXISTS indexedblock (
+        number INTEGER NOT NULL,
+        hash VARCHAR NOT NULL,
+        PRIMARY KEY (number)
+    )""",
+    """CREATE TABLE IF NOT EXISTS indexercheckpoint (
+        name VARCHAR NOT NULL,
+        contract_address VARCHAR NOT NULL,
+        block_number INTEGER NOT NULL,
+        block_hash VARCHAR,
+        PRIMARY KEY (name)
+    )""",
+]
+
+
+def _create_tables(connection):
+    for statement in SCHEMA_V1:
+        connection.execute(text(statement))
+
+
+def _duplicates(connection, column: str, limit: int = 10) -> list:
+    return (
+        connection.execute(
+            text(
+                f'SELECT "{column}" FROM user WHERE "{column}" IS NOT NULL '
+                f'GROUP BY "{column}" HAVING COUNT(*) > 1 LIMIT {limit}'
+            )
+        )
+        .scalars()
+        .all()
+    )
+
+
+def _check_unique(connection, column: str):
+    duplicates = _duplicates(connection, column)
+    if duplicates:
+        # Stop rather than index them non-unique, code relies on the constraint
+        raise RuntimeError(
+            f"Duplicate user.{column} values, remove them and restart: "
+            + ", ".join(map(str, duplicates))
+        )
+
+
+def _create_index(connection, name: str, column: str, unique: bool = False):
+    if unique:
+        _check_unique(connection, column)
+    connection.execute(
+        text(
+            f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {name} "
+            f'ON user ("{column}")'
+        )
+    )
+
+
+def _add_user_indexes(connection):
+    _create_index(connection, "ix_user_email", "email", unique=True)
+    _create_index(connection, "ix_user_access_token", "access_token")
+    _create_index(
+        connection, "ix_user_blockchain_address", "blockchain_address", unique=True
+    )
+    _create_index(connection, "ix_user_isOnline", "isOnline")
+
+
+def _create_revoked_subjects(connection):
+    connection.execute(
+        text(
+            """CREATE TABLE IF NOT EXISTS revokedsubject (
+                subject VARCHAR NOT NULL,
+                not_before FLOAT NOT NULL,
+                expires_at FLOAT NOT NULL,
+                PRIMARY KEY (subject)
+            )"""
+        )
+    )
+    connection.execute(
+        text(
+            "CREATE INDEX IF NOT EXISTS ix_revokedsubject_expires_at "
+            "ON revokedsubject (expires_at)"
+        )
+    )
+
+
+def _create_presence(connection):
+    connection.execute(
+        text(
+            """CREATE TABLE IF NOT EXISTS presence (
+                user_id INTEGER NOT NULL,
+                expires_at FLOAT NOT NULL,
+                PRIMARY KEY (user_id)
+            )"""
+        )
+    )
+    connection.execute(
+        text(
+            "CREATE INDEX IF NOT EXISTS ix_presence_expires_at "
+            "ON presence (expires_at)"
+        )
+    )
+
+
+# (version, description, function(connection)), applied in order and never edited
+# once released; add a new entry for every schema change
+MIGRATIONS = [
+    (1, "Create tables", _create_tables),
+    (2, "Index user lookup columns", _add_user_indexes),
+    (3, "Revoke every token of a user", _create_revoked_subjects),
+    (4, "Share heartbeats between workers", _create_presence),
+]
+
+
+def get_schema_version(connection) -> int:
+    connection.execute(
+        text(
+            "CREATE TABLE IF NOT EXISTS schema_version ("
+            "version INTEGER PRIMARY KEY, description VARCHAR NOT NULL, "
+            "applied_at DATETIME NOT NULL)"
+        )
+    )
+    return connection.execute(
+        text("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+    ).scalar()
+
+
+def _lock(connection):
+    # pysqlite only opens a transaction before DML, so without this the version
+    # check and the migration would not run under the write lock
+    connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+def run_migrations(engine=engine) -> int:
+    """
+    Bring the database up to the latest schema version. Every migration runs in
+    its own transaction together with its schema_version row, holding the write
+    lock from the version check on so concurrent workers apply it once. Returns
+    the number of migrations applied.
+    """
+    with engine.begin() as connection:
+        _lock(connection)
+        current = get_schema_version(connection)
+
+    applied = 0
+    for version, description, migrate in MIGRATIONS:
+        if version <= current:
+            continue
+        with engine.begin() as connection:
+            _lock(connection)
+            # Another worker may have migrated while we waited for the lock
+            if get_schema_version(connection) >= version:
+                continue
+            logger.info("Applying migration %s: %s", version, description)
+            migrate(connection)
+            connection.execute(
+                text(
+                    "INSERT INTO schema_version (version, description, applied_at) "
+                    "VALUES (:version, :description, :applied_at)"
+                ),
+                {
+                    "version": version,
+                    "description": description,
+                    "applied_at": datetime.utcnow(),
+                },
+            )
+        applied += 1
+    return applied
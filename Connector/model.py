@@ -1,4 +1,7 @@
+from datetime import datetime
+
 from pydantic import BaseModel
+from sqlalchemy import Index, UniqueConstraint
 from sqlmodel import Field, SQLModel
 
 
@@ -6,24 +9,176 @@ from sqlmodel import Field, SQLModel
 class User(SQLModel, table=True):
     id: int = Field(default=None, primary_key=True)
     username: str
-    email: str
+    email: str = Field(index=True, unique=True)
     phone: str
     password_hash: str
     public_key: str = Field(nullable=True)
     private_key: str = Field(nullable=True)
-    blockchain_address: str = Field(nullable=True)
+    blockchain_address: str = Field(nullable=True, index=True, unique=True)
     role: str
     did: str = Field(nullable=True)
-    access_token: str = Field(default=None, nullable=True)
+    access_token: str = Field(default=None, nullable=True, index=True)
     isPWLess: bool
-    isOnline: bool
+    isOnline: bool = Field(index=True)
+
+
+class Job(SQLModel, table=True):
+    """
+    A queued on-chain write (register_did, revoke_did, issue_vc).
+    """
+
+    id: int = Field(default=None, primary_key=True)
+    kind: str
+    payload: str  # JSON encoded function arguments
+    status: str = Field(default="queued", index=True)  # queued/running/succeeded/failed
+    attempts: int = 0
+    tx_hash: str = Field(default=None, nullable=True)
+    block_number: int = Field(default=None, nullable=True)
+    receipt_status: int = Field(default=None, nullable=True)
+    error: str = Field(default=None, nullable=True)
+    callback_url: str = Field(default=None, nullable=True)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class Challenge(SQLModel, table=True):
+    """
+    A pending passwordless login challenge (see challenge_store.py).
+    """
+
+    address: str = Field(primary_key=True)  # lowercase
+    challenge: str
+    expires_at: float = Field(index=True)  # Unix timestamp
+
+
+class RevokedToken(SQLModel, table=True):
+    token_hash: str = Field(primary_key=True)  # sha256 of the JWT
+    expires_at: float = Field(index=True)  # The token's exp, rows can go after it
+
+
+class RevokedSubject(SQLModel, table=True):
+    """
+    Every token of `subject` (the `sub` email) issued at or before `not_before`
+    is revoked, e.g. when the user is deleted.
+    """
+
+    subject: str = Field(primary_key=True)
+    not_before: float
+    expires_at: float = Field(index=True)  # When the last such token has expired
+
+
+class Presence(SQLModel, table=True):
+    """
+    When a user's last heartbeat (received by any worker) expires.
+    """
+
+    user_id: int = Field(primary_key=True)
+    expires_at: float = Field(index=True)  # Unix timestamp
+
+
+class PoolAccount(SQLModel, table=True):
+    """
+    A blockchain account from accounts.json and the user it is allocated to.
+    """
+
+    # Lets allocation find the first free account with one index seek
+    __table_args__ = (Index("ix_poolaccount_user_id_position", "user_id", "position"),)
+
+    address: str = Field(primary_key=True)
+    private_key: str
+    position: int  # Order in accounts.json
+    user_id: int = Field(default=None, nullable=True)
+    allocated_at: datetime = Field(default=None, nullable=True)
+
+
+# Local mirror of the DIDRegistry contract, maintained by indexer.py
+class ChainEvent(SQLModel, table=True):
+    """
+    A DIDRegistry event (or a revokeDID call, which emits none) seen on-chain.
+    Derived tables are rebuilt from these rows when a reorg is rolled back.
+    """
+
+    __table_args__ = (UniqueConstraint("tx_hash", "log_index"),)
+
+    id: int = Field(default=None, primary_key=True)
+    block_number: int = Field(index=True)
+    block_hash: str
+    tx_hash: str
+    log_index: int  # -1 for revokeDID calls
+    event: str  # DIDRegistered/DIDRevoked/VCIssued/VCRevoked
+    address: str = Field(index=True)  # DID owner or VC holder, lowercase
+    issuer: str = Field(default=None, nullable=True)
+    did: str = Field(default=None, nullable=True)
+    credential_hash: str = Field(default=None, nullable=True)
+
+
+class IndexedDID(SQLModel, table=True):
+    address: str = Field(primary_key=True)  # lowercase
+    did: str
+    block_number: int
+
+
+class IndexedCredential(SQLModel, table=True):
+    id: int = Field(default=None, primary_key=True)
+    holder: str = Field(index=True)  # lowercase
+    issuer: str  # lowercase
+    credential_hash: str = Field(index=True)
+    is_revoked: bool = False
+    issued_block: int
+    revoked_block: int = Field(default=None, nullable=True)
+
+
+class IndexedBlock(SQLModel, table=True):
+    """
+    Hashes of recently indexed blocks, used to find the fork point of a reorg.
+    """
+
+    number: int = Field(primary_key=True)
+    hash: str
+
+
+class IndexerCheckpoint(SQLModel, table=True):
+    name: str = Field(primary_key=True)
+    contract_address: str
+    block_number: int
+    block_hash: str = Field(default=None, nullable=True)
 
 
 class LoginRequest(BaseModel):
-    username: str
+    email: str
     password: str  # This field is still required for password-based users
 
 
+class TokenRequest(BaseModel):
+    token: str  # JWT from /token
+
+
+class RegisterRequest(BaseModel):
+    username: str
+    email: str
+    phone: str
+    role: str
+    password: str
+    isPWLess: bool = False
+
+
+class UserUpdate(BaseModel):
+    # Only the fields sent are applied; unknown ones (e.g. id) are ignored
+    username: str | None = None
+    email: str | None = None
+    phone: str | None = None
+    role: str | None = None
+    password_hash: str | None = None
+    public_key: str | None = None
+    private_key: str | None = None
+    blockchain_address: str | None = None
+    did: str | None = None
+    access_token: str | None = None
+    isPWLess: bool | None = None
+    isOnline: bool | None = None
+    callback_url: str | None = None  # Notified when the DID registration job ends
+
+
 class Token(BaseModel):
     access_token: str
     token_type: str
@@ -46,6 +201,14 @@ class VerifyRequest(BaseModel):
     signature: str  # Signed message
 
 
+class ResolveDIDsRequest(BaseModel):
+    addresses: list[str]  # Ethereum addresses to resolve
+
+
+class VerifyBatchRequest(BaseModel):
+    items: list[VerifyRequest]
+
+
 class RegisterDID(BaseModel):
     user: str
     public_key: str
@@ -0,0 +1,270 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import utils
+
+BULK_RECEIPT_WORKERS = int(os.getenv("CONNECTOR_BULK_RECEIPT_WORKERS", "16"))
+BULK_RECEIPT_TIMEOUT = float(os.getenv("CONNECTOR_BULK_RECEIPT_TIMEOUT", "60"))
+BULK_MAX_RESUBMITS = int(os.getenv("CONNECTOR_BULK_MAX_RESUBMITS", "3"))
+# Nodes only accept a replacement for a pending nonce with a >= 10% higher price
+GAS_BUMP_PERCENT = 15
+
+logger = logging.getLogger(__name__)
+
+
+class NonceManager:
+    """
+    Assigns transaction nonces per sender locally, so many transactions can be
+    sent back to back without asking the node (or waiting for receipts) in
+    between. The manager assumes it is the only writer for the senders it serves.
+    """
+
+    def __init__(self, web3=None):
+        self.web3 = web3
+        self._nonces = {}
+        self._lock = threading.Lock()
+
+    def _w3(self):
+        return self.web3 or utils.w3
+
+    def next_nonce(self, sender: str) -> int:
+        with self._lock:
+            if sender not in self._nonces:
+                self._nonces[sender] = self._w3().eth.get_transaction_count(
+                    sender, "pending"
+                )
+            nonce = self._nonces[sender]
+            self._nonces[sender] = nonce + 1
+            return nonce
+
+    def set_next(self, sender: str, nonce: int):
+        with self._lock:
+            self._nonces[sender] = nonce
+
+    def resync(self, sender: str, block_identifier: str = "pending") -> int:
+        """
+        Reload the next nonce for `sender` from the node.
+        """
+        nonce = self._w3().eth.get_transaction_count(sender, block_identifier)
+        self.set_next(sender, nonce)
+        return nonce
+
+    def reset(self, sender: str | None = None):
+        with self._lock:
+            if sender is None:
+                self._nonces.clear()
+            else:
+                self._nonces.pop(sender, None)
+
+
+nonce_manager = NonceManager()
+
+
+class PendingTransaction:
+    """
+    One contract call tracked through the bulk submitter.
+    """
+
+    def __init__(self, sender: str, function, private_key: str = None, key=None):
+        self.sender = sender
+        self.function = function  # bound contract function, e.g. fn(address, did)
+        self.private_key = private_key  # sign locally when given
+        self.key = key  # caller's identifier for the result
+        self.tx = None
+        self.tx_hash = None
+        self.tx_hashes = []  # every hash sent for it, any of them may be mined
+        self.receipt = None
+        self.error = None
+        self.resubmits = 0
+
+    @property
+    def status(self):
+        if self.error:
+            return "failed"
+        if self.receipt is None:
+            return "pending"
+        return "succeeded" if self.receipt["status"] == 1 else "reverted"
+
+
+class BulkSubmitter:
+    """
+    Sends many transactions without waiting between them, then gathers the
+    receipts concurrently.
+
+    Transactions that never get a receipt (dropped from the mempool, replaced by
+    another transaction with the same nonce, or stuck behind a nonce gap) are
+    re-sent: the sender's unresolved transactions get consecutive nonces again
+    from the sender's confirmed count, with a bumped gas price so they replace
+    anything still pending at those nonces. Before that every hash sent for a
+    transaction is checked for a receipt, since one mined after its wait timed
+    out must not be sent twice.
+    """
+
+    def __init__(
+        self,
+        web3=None,
+        nonces: NonceManager = None,
+        receipt_timeout: float = BULK_RECEIPT_TIMEOUT,
+        max_resubmits: int = BULK_MAX_RESUBMITS,
+        workers: int = BULK_RECEIPT_WORKERS,
+    ):
+        self.web3 = web3
+        self.nonces = nonces or nonce_manager
+        self.receipt_timeout = receipt_timeout
+        self.max_resubmits = max_resubmits
+        self.workers = workers
+
+    def _w3(self):
+        return self.web3 or utils.w3
+
+    def _build(self, ptx: PendingTransaction, gas_price: int):
+        # Gas estimation happens here, so a call that would revert fails before it
+        # takes a nonce and leaves a gap
+        try:
+            ptx.tx = ptx.function.build_transaction(
+                {"from": ptx.sender, "gasPrice": gas_price}
+            )
+        except Exception as e:
+            ptx.error = str(e)
+
+    def _send(self, ptx: PendingTransaction, nonce: int):
+        w3 = self._w3()
+        ptx.tx["nonce"] = nonce
+        try:
+            if ptx.private_key:
+                signed = w3.eth.account.sign_transaction(ptx.tx, ptx.private_key)
+                ptx.tx_hash = w3.eth.send_raw_transaction(signed.rawTransaction)
+            else:
+                ptx.tx_hash = w3.eth.send_transaction(ptx.tx)
+            ptx.tx_hashes.append(ptx.tx_hash)
+        except Exception as e:
+            # Nothing was broadcast; the wait step treats it like a dropped tx
+            logger.warning("Sending nonce %s from %s failed: %s", nonce, ptx.sender, e)
+            ptx.tx_hash = None
+
+    def _wait(self, ptx: PendingTransaction):
+        from web3.exceptions import TimeExhausted
+
+        if ptx.tx_hash is None:
+            return None
+        try:
+            return self._w3().eth.wait_for_transaction_receipt(
+                ptx.tx_hash, timeout=self.receipt_timeout
+            )
+        except TimeExhausted:
+            return None
+
+    def _gather(self, pending):
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            receipts = pool.map(self._wait, pending)
+            for ptx, receipt in zip(pending, receipts):
+                ptx.receipt = receipt
+
+    def _find_receipt(self, ptx: PendingTransaction):
+        from web3.exceptions import TransactionNotFound
+
+        for tx_hash in reversed(ptx.tx_hashes):
+            try:
+                return self._w3().eth.get_transaction_receipt(tx_hash)
+            except TransactionNotFound:
+                continue
+        return None
+
+    def _resubmit(self, unresolved):
+        by_sender = {}
+        for ptx in unresolved:
+            by_sender.setdefault(ptx.sender, []).append(ptx)
+
+        for sender, txs in by_sender.items():
+            # Counted before looking for receipts: a transaction below this
+            # count was mined by then, so its receipt is found below
+            confirmed = self._w3().eth.get_transaction_count(sender, "latest")
+            resend = []
+            for ptx in txs:
+                ptx.receipt = self._find_receipt(ptx)
+                if ptx.receipt is not None:
+                    continue
+                if ptx.tx["nonce"] < confirmed:
+                    # None of its hashes was mined yet its nonce is used: another
+                    # transaction took it, and guessing whether to send it again
+                    # could duplicate it
+                    ptx.error = f"Nonce {ptx.tx['nonce']} used by another transaction"
+                    continue
+                resend.append(ptx)
+
+            if resend:
+                logger.warning(
+                    "Re-sending %s unconfirmed transactions from %s",
+                    len(resend),
+                    sender,
+                )
+            resend.sort(key=lambda ptx: ptx.tx["nonce"])
+            for offset, ptx in enumerate(resend):
+                ptx.resubmits += 1
+                ptx.tx["gasPrice"] = (
+                    ptx.tx["gasPrice"] * (100 + GAS_BUMP_PERCENT) // 100
+                )
+                self._send(ptx, confirmed + offset)
+            self.nonces.set_next(sender, confirmed + len(resend))
+
+    def submit(self, transactions):
+        """
+        Pipeline `transactions` (PendingTransaction objects) and return them with
+        their receipt or error filled in.
+        """
+        w3 = self._w3()
+        gas_price = w3.eth.gas_price
+        for ptx in transactions:
+            self._build(ptx, gas_price)
+
+        pending = [ptx for ptx in transactions if not ptx.error]
+        for ptx in pending:
+            self._send(ptx, self.nonces.next_nonce(ptx.sender))
+
+        for attempt in range(self.max_resubmits + 1):
+            self._gather(pending)
+            pending = [ptx for ptx in pending if ptx.receipt is None]
+            if not pending:
+                break
+            if attempt < self.max_resubmits:
+                self._resubmit(pending)
+                pending = [
+                    ptx for ptx in pending if ptx.receipt is None and not ptx.error
+                ]
+                if not pending:
+                    break
+
+        for ptx in pending:
+            ptx.error = "No receipt after resubmission"
+            self.nonces.reset(ptx.sender)
+        return transactions
+
+
+def register_dids_bulk(accounts, sender: str | None = None, private_key: str = None):
+    """
+    Register a DID for every account (dicts with `account`/`privateKey`, as in
+    accounts.json) in one pipelined pass. Each account registers its own DID
+    unless `sender` is given, in which case all transactions come from it.
+    """
+    contract = utils.initialize_contract()
+    transactions = []
+    for account in accounts:
+        address = account["account"]
+        transactions.append(
+            PendingTransaction(
+                sender=sender or address,
+                function=contract.functions.registerDID(
+                    address, utils.make_did(address)
+                ),
+                private_key=private_key if sender else account.get("privateKey"),
+                key=address,
+            )
+        )
+
+    BulkSubmitter().submit(transactions)
+    for ptx in transactions:
+        if ptx.status == "succeeded":
+            utils.did_cache.invalidate(ptx.key.lower())
+    return transactions
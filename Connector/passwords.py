@@ -0,0 +1,118 @@
+import asyncio
+import hmac
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from passlib.context import CryptContext
+
+from metrics import timed
+
+# bcrypt cost factor (2^rounds iterations); each +1 doubles the time per login
+PASSWORD_HASH_ROUNDS = int(os.getenv("CONNECTOR_PASSWORD_HASH_ROUNDS", "12"))
+# Threads hashing and verifying passwords, bcrypt releases the GIL while it works
+PASSWORD_WORKERS = int(
+    os.getenv("CONNECTOR_PASSWORD_WORKERS", str(min(os.cpu_count() or 1, 4)))
+)
+
+logger = logging.getLogger(__name__)
+# passlib 1.7 looks for bcrypt.__about__, gone in bcrypt 4.1, and logs a
+# traceback about it on first use; hashing itself is unaffected
+logging.getLogger("passlib.handlers.bcrypt").setLevel(logging.ERROR)
+
+# Hashes made with fewer rounds than configured are flagged for an update
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=PASSWORD_HASH_ROUNDS,
+    bcrypt__min_rounds=PASSWORD_HASH_ROUNDS,
+)
+
+
+def verify_and_update(password: str, stored: str, context=pwd_context):
+    """
+    Check a password against the stored value. Returns (valid, new hash), the
+    new hash being set when the stored value is plaintext (from before
+    passwords were hashed) or a hash of a weaker cost that should be replaced.
+    """
+    if not stored:
+        return False, None
+    if context.identify(stored) is None:
+        if hmac.compare_digest(password.encode("utf-8"), stored.encode("utf-8")):
+            return True, context.hash(password)
+        return False, None
+    try:
+        return context.verify_and_update(password, stored)
+    except ValueError as e:
+        logger.warning("Unreadable password hash: %s", e)
+        return False, None
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt off the event loop on a bounded thread pool: a login waits for
+    a free worker instead of blocking every other request for the whole hash,
+    and at most `workers` hashes run at once whatever the load.
+    """
+
+    def __init__(
+        self, rounds: int = PASSWORD_HASH_ROUNDS, workers: int = PASSWORD_WORKERS
+    ):
+        self.workers = max(workers, 1)
+        self.context = pwd_context
+        if rounds != PASSWORD_HASH_ROUNDS:
+            self.context = pwd_context.copy(
+                bcrypt__rounds=rounds, bcrypt__min_rounds=rounds
+            )
+        self._dummy_hash = None
+        self._pool = None
+
+    def _executor(self):
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="password"
+            )
+        return self._pool
+
+    def _verify(self, password: str, stored):
+        if stored is None:
+            # Hash anyway when the user does not exist, so both cases take as long
+            if self._dummy_hash is None:
+                self._dummy_hash = self.context.hash("")
+            self.context.verify(password, self._dummy_hash)
+            return False, None
+        return verify_and_update(password, stored, self.context)
+
+    async def hash(self, password: str) -> str:
+        loop = asyncio.get_running_loop()
+        with timed("password_hash"):
+            return await loop.run_in_executor(
+                self._executor(), self.context.hash, password
+            )
+
+    async def verify(self, password: str, stored):
+        """
+        Returns (valid, new hash or None), see verify_and_update. A missing
+        user (stored is None) still costs one hash.
+        """
+        loop = asyncio.get_running_loop()
+        with timed("password_verify"):
+            return await loop.run_in_executor(
+                self._executor(), self._verify, password, stored
+            )
+
+    def hash_many(self, passwords: list) -> list:
+        """
+        Hash a batch of passwords on the worker threads and wait for all of
+        them, for callers that are not on the event loop (bulk imports).
+        """
+        with timed("password_hash_batch"):
+            return list(self._executor().map(self.context.hash, passwords))
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,203 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert
+from sqlmodel import Session, col, delete, select, update
+
+from database import engine
+from model import Presence, User
+
+# Seconds without a heartbeat before a user counts as offline
+PRESENCE_TTL = float(os.getenv("CONNECTOR_PRESENCE_TTL", "120"))
+# Seconds between syncs of heartbeats with the presence table and user.isOnline
+PRESENCE_FLUSH_INTERVAL = float(os.getenv("CONNECTOR_PRESENCE_FLUSH_INTERVAL", "10"))
+# Rows per INSERT or DELETE ... WHERE user_id IN (...) statement
+PRESENCE_FLUSH_BATCH = 500
+
+logger = logging.getLogger(__name__)
+
+
+class PresenceTracker:
+    """
+    Tracks which users are online from their heartbeats.
+
+    Entries are kept in memory in expiry order, and every user has the same TTL,
+    so the ones that expire first are always at the front: expiring them and
+    counting the rest is amortised O(1) and never queries the database.
+
+    Every few seconds each process writes the heartbeats and logouts it received
+    to the `presence` table, drops the expired rows, sets user.isOnline from the
+    rows left and reloads them. Those statements only depend on the table, so
+    with several workers a user stays online while any of them gets heartbeats,
+    and each counts the users of the others (seen up to one flush late).
+    """
+
+    def __init__(
+        self, ttl: float = PRESENCE_TTL, flush_interval: float = PRESENCE_FLUSH_INTERVAL
+    ):
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self._expires = OrderedDict()  # user id -> expiry (Unix time)
+        self._heartbeats = {}  # user id -> expiry not yet written
+        self._removed = set()  # users logged out or deleted, not yet written
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _expire(self, now: float):
+        # Caller holds the lock
+        while self._expires:
+            user_id, expires_at = next(iter(self._expires.items()))
+            if expires_at > now:
+                break
+            del self._expires[user_id]
+
+    def touch(self, user_id: int) -> float:
+        """
+        Record a heartbeat. Returns the seconds until the user expires.
+        """
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._expires.pop(user_id, None)
+            self._expires[user_id] = expires_at
+            self._heartbeats[user_id] = expires_at
+            self._removed.discard(user_id)
+        return self.ttl
+
+    def remove(self, user_id: int):
+        """
+        Take a user offline in every worker, e.g. on logout or deletion.
+        """
+        with self._lock:
+            self._expires.pop(user_id, None)
+            self._heartbeats.pop(user_id, None)
+            self._removed.add(user_id)
+
+    def is_online(self, user_id: int) -> bool:
+        with self._lock:
+            self._expire(time.time())
+            return user_id in self._expires
+
+    def count(self) -> int:
+        with self._lock:
+            self._expire(time.time())
+            return len(self._expires)
+
+    def flush(self) -> int:
+        """
+        Write the heartbeats and removals received since the last flush, update
+        user.isOnline and reload the users online in any worker. Returns the
+        number of users online.
+        """
+        with self._lock:
+            heartbeats, self._heartbeats = self._heartbeats, {}
+            removed, self._removed = self._removed, set()
+
+        try:
+            with Session(engine) as session:
+                rows = [
+                    {"user_id": user_id, "expires_at": expires_at}
+                    for user_id, expires_at in heartbeats.items()
+                ]
+                for i in range(0, len(rows), PRESENCE_FLUSH_BATCH):
+                    statement = insert(Presence).values(
+                        rows[i : i + PRESENCE_FLUSH_BATCH]
+                    )
+                    session.execute(
+                        statement.on_conflict_do_update(
+                            index_elements=["user_id"],
+                            set_={
+                                "expires_at": func.max(
+                                    Presence.expires_at, statement.excluded.expires_at
+                                )
+                            },
+                        )
+                    )
+                user_ids = list(removed)
+                for i in range(0, len(user_ids), PRESENCE_FLUSH_BATCH):
+                    session.execute(
+                        delete(Presence).where(
+                            col(Presence.user_id).in_(
+                                user_ids[i : i + PRESENCE_FLUSH_BATCH]
+                            )
+                        )
+                    )
+                session.execute(
+                    delete(Presence).where(Presence.expires_at <= time.time())
+                )
+
+                online = select(Presence.user_id)
+                session.execute(
+                    update(User)
+                    .where(User.isOnline == False, col(User.id).in_(online))
+                    .values(isOnline=True)
+                )
+                session.execute(
+                    update(User)
+                    .where(User.isOnline == True, col(User.id).not_in(online))
+                    .values(isOnline=False)
+                )
+                expires = OrderedDict(
+                    session.execute(
+                        select(Presence.user_id, Presence.expires_at).order_by(
+                            Presence.expires_at
+                        )
+                    ).all()
+                )
+                session.commit()
+        except Exception:
+            # Keep them for the next flush, unless a newer heartbeat or removal
+            # replaced them
+            with self._lock:
+                for user_id, expires_at in heartbeats.items():
+                    if user_id not in self._removed:
+                        self._heartbeats.setdefault(user_id, expires_at)
+                self._removed |= removed - self._heartbeats.keys()
+            raise
+
+        with self._lock:
+            # Heartbeats and removals that arrived while writing are newer
+            for user_id in self._removed:
+                expires.pop(user_id, None)
+            for user_id, expires_at in self._heartbeats.items():
+                expires.pop(user_id, None)
+                expires[user_id] = expires_at
+            self._expires = expires
+            return len(expires)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error("Error flushing online users: %s", e)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error("Error loading online users: %s", e)
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="presence-flush", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.flush_interval + 1)
+            self._thread = None
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error("Error flushing online users: %s", e)
+
+
+presence_tracker = PresenceTracker()
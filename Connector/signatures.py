@@ -0,0 +1,127 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from metrics import timed
+
+# Processes used for ECDSA recovery (0 runs it on the default thread pool)
+SIGNATURE_WORKERS = int(
+    os.getenv("CONNECTOR_SIGNATURE_WORKERS", str(min(os.cpu_count() or 1, 4)))
+)
+# Signatures sent to a worker process in one task
+SIGNATURE_CHUNK_SIZE = int(os.getenv("CONNECTOR_SIGNATURE_CHUNK_SIZE", "64"))
+
+logger = logging.getLogger(__name__)
+
+
+# Helper function to verify the signature (updated to work with message hash and Ethereum prefix)
+def verify_signature(message: str, signature: str, address: str) -> bool:
+    from eth_account import Account
+    from web3 import Web3
+
+    try:
+        # Ensure the message is a hex string, if not, raise an error
+        if message.startswith("0x"):
+            message_bytes = bytes.fromhex(
+                message[2:]
+            )  # Convert from hex to bytes (ignore '0x')
+        else:
+            # If it's a string message, encode it as bytes
+            message_bytes = message.encode("utf-8")
+
+        # Step 1: Prefix the message with the Ethereum message prefix and hash it
+        prefix = f"\x19Ethereum Signed Message:\n{len(message)}".encode("utf-8")
+        prefixed_hash = Web3.solidity_keccak(
+            ["bytes", "bytes"], [prefix, message_bytes]
+        )
+
+        # Step 2: Recover the address from the signature
+        recovered_address = Account._recover_hash(prefixed_hash, signature=signature)
+
+        # Step 3: Compare the recovered address with the provided address
+        return recovered_address.lower() == address.lower()
+    except Exception as e:
+        # Malformed input from the client, not a server error
+        logger.debug("Error verifying signature: %s", e)
+        return False
+
+
+def verify_signatures(items) -> list:
+    """
+    Verify (address, message, signature) tuples, run inside a worker process.
+    """
+    return [
+        verify_signature(message, signature, address)
+        for address, message, signature in items
+    ]
+
+
+class SignatureVerifier:
+    """
+    Runs the CPU-bound keccak + ECDSA recovery off the event loop on a process
+    pool, so login storms use every core instead of serialising on one.
+    """
+
+    def __init__(
+        self, workers: int = SIGNATURE_WORKERS, chunk_size: int = SIGNATURE_CHUNK_SIZE
+    ):
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self._pool = None
+
+    def _executor(self):
+        if self.workers <= 0:
+            return None  # default thread pool
+        if self._pool is None:
+            # spawn: forking a process that already runs background threads is unsafe
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._pool
+
+    async def verify(self, message: str, signature: str, address: str) -> bool:
+        loop = asyncio.get_running_loop()
+        with timed("signature_verify"):
+            return await loop.run_in_executor(
+                self._executor(), verify_signature, message, signature, address
+            )
+
+    async def verify_many(self, items) -> list:
+        """
+        Verify a list of (address, message, signature) tuples, in chunks spread
+        over the pool. Results keep the input order.
+        """
+        items = list(items)
+        if not items:
+            return []
+        loop = asyncio.get_running_loop()
+        executor = self._executor()
+        chunk_size = self.chunk_size
+        if self.workers > 0:
+            # Keep every worker busy even for small batches
+            chunk_size = max(1, min(chunk_size, -(-len(items) // self.workers)))
+        chunks = [items[i : i + chunk_size] for i in range(0, len(items), chunk_size)]
+        with timed("signature_verify_batch"):
+            results = await asyncio.gather(
+                *(loop.run_in_executor(executor, verify_signatures, c) for c in chunks)
+            )
+        return [valid for chunk in results for valid in chunk]
+
+    def warm_up(self):
+        """
+        Start the worker processes now instead of on the first login.
+        """
+        executor = self._executor()
+        if executor is not None:
+            list(executor.map(verify_signatures, [[]] * self.workers))
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+signature_verifier = SignatureVerifier()
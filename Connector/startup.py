@@ -0,0 +1,102 @@
+import inspect
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import text
+from sqlmodel import Session
+
+import utils
+from account_pool import account_pool
+from async_chain import get_async_w3, initialize_async_contract
+from database import DB_POOL_SIZE, async_engine, engine
+from signatures import signature_verifier
+
+# Open the RPC and database connections and load web3, the contract and the pool
+# account keys before the worker reports ready, instead of on the first requests
+WARMUP = os.getenv("CONNECTOR_WARMUP", "0") == "1"
+
+logger = logging.getLogger(__name__)
+
+
+class StartupProfile:
+    """
+    Times the phases of the startup hook and logs them as one line.
+    """
+
+    def __init__(self):
+        self.phases = {}
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = time.perf_counter() - started
+
+    def report(self):
+        total = time.perf_counter() - self._started
+        logger.info(
+            "Started in %.0f ms (%s)",
+            total * 1000,
+            ", ".join(f"{name} {s * 1000:.0f} ms" for name, s in self.phases.items()),
+        )
+        return total
+
+
+async def warm_database():
+    # Check out a full pool at once so every connection is opened, and its
+    # pragmas run, now
+    connections = [engine.connect() for _ in range(DB_POOL_SIZE)]
+    for connection in connections:
+        connection.execute(text("SELECT 1"))
+        connection.close()
+    if async_engine is not None:
+        connections = [await async_engine.connect() for _ in range(DB_POOL_SIZE)]
+        for connection in connections:
+            await connection.execute(text("SELECT 1"))
+            await connection.close()
+
+
+def warm_account_keys():
+    with Session(engine) as session:
+        account_pool.precompute_keys(session)
+
+
+def warm_web3():
+    # Imports web3, loads the contract and opens the keep-alive connection
+    utils.initialize_contract()
+    utils.get_w3().eth.block_number
+
+
+async def warm_async_web3():
+    initialize_async_contract()
+    await get_async_w3().eth.block_number
+
+
+async def warm_up(async_web3: bool = True, profile: StartupProfile = None):
+    """
+    Run every warm-up step. A failing step (e.g. the node is down) is logged and
+    skipped, its work then happens on the first request that needs it.
+    """
+    profile = profile or StartupProfile()
+    steps = [
+        ("database", warm_database),
+        ("account_keys", warm_account_keys),
+        ("web3", warm_web3),
+        ("signature_workers", signature_verifier.warm_up),
+    ]
+    if async_web3:
+        steps.append(("async_web3", warm_async_web3))
+    for name, step in steps:
+        with profile.phase(f"warm-up {name}"):
+            try:
+                result = step()
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logger.warning("Warm-up step %s failed: %s", name, e)
+    return profile
@@ -0,0 +1,179 @@
+import hashlib
+import os
+import threading
+import time
+
+from jose import JWTError, jwt
+from sqlalchemy import text
+from sqlmodel import Session, select
+
+from cache import TTLCache
+from database import engine
+from metrics import timed
+from model import RevokedSubject, RevokedToken, User
+from utils import ALGORITHM, SECRET_KEY
+
+TOKEN_CACHE_SIZE = int(os.getenv("CONNECTOR_TOKEN_CACHE_SIZE", "10000"))
+# Seconds between reloads of revocations made by other workers
+TOKEN_REVOCATION_SYNC_INTERVAL = float(
+    os.getenv("CONNECTOR_TOKEN_REVOCATION_SYNC_INTERVAL", "1")
+)
+# Upper bound on a token's lifetime, for revocations of tokens without `exp`
+TOKEN_MAX_LIFETIME = 24 * 3600
+
+
+def token_hash(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+class TokenValidator:
+    """
+    Validates access tokens without decoding the JWT on every request.
+
+    Decoded claims are cached by token hash until the token's `exp`. Revoked
+    tokens (logout) and users whose every token is revoked (deleted users) are
+    kept in memory, persisted to the `revokedtoken` and `revokedsubject`
+    tables and reloaded every few seconds, so a revocation made by any worker
+    takes effect everywhere.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = TOKEN_CACHE_SIZE,
+        sync_interval: float = TOKEN_REVOCATION_SYNC_INTERVAL,
+    ):
+        self.claims_cache = TTLCache(maxsize=maxsize)
+        self.sync_interval = sync_interval
+        self._revoked = {}  # token hash -> expiry timestamp
+        self._not_before = {}  # sub -> tokens issued at or before it are revoked
+        self._synced_at = 0.0
+        self._lock = threading.Lock()
+
+    def _sync_revocations(self):
+        now = time.time()
+        if now - self._synced_at < self.sync_interval:
+            return
+        with Session(engine) as session:
+            rows = session.exec(
+                select(RevokedToken.token_hash, RevokedToken.expires_at).where(
+                    RevokedToken.expires_at > now
+                )
+            ).all()
+            subjects = session.exec(
+                select(RevokedSubject.subject, RevokedSubject.not_before).where(
+                    RevokedSubject.expires_at > now
+                )
+            ).all()
+        with self._lock:
+            self._revoked = dict(rows)
+            self._not_before = dict(subjects)
+            self._synced_at = now
+
+    def decode(self, token: str) -> dict:
+        """
+        Return the token's claims. Raises JWTError if the token is malformed,
+        expired or revoked.
+        """
+        if not token:
+            raise JWTError("Missing token")
+        key = token_hash(token)
+        self._sync_revocations()
+        if key in self._revoked:
+            raise JWTError("Token has been revoked")
+
+        claims = self.claims_cache.get(key)
+        if claims is None:
+            with timed("jwt_decode"):
+                claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            if "exp" in claims:
+                self.claims_cache.set(key, claims, ttl=claims["exp"] - time.time())
+        elif claims.get("exp", float("inf")) <= time.time():
+            self.claims_cache.invalidate(key)
+            raise JWTError("Token has expired")
+
+        not_before = self._not_before.get(claims.get("sub"))
+        if not_before is not None and claims.get("iat", 0) <= not_before:
+            raise JWTError("Token has been revoked")
+        return claims
+
+    def resolve_user(self, session: Session, token: str) -> User | None:
+        """
+        Return the user a valid token belongs to, by primary key when the token
+        carries a `uid` claim (older tokens fall back to the `sub` email). The
+        email must match too: ids of deleted users are reused by SQLite.
+        """
+        claims = self.decode(token)
+        if claims.get("uid") is not None:
+            user = session.get(User, claims["uid"])
+            return user if user and user.email == claims.get("sub") else None
+        return session.exec(select(User).where(User.email == claims.get("sub"))).first()
+
+    def resolve_user_id(self, session: Session, token: str) -> int | None:
+        """
+        Like resolve_user, but only selects the id.
+        """
+        claims = self.decode(token)
+        statement = select(User.id).where(User.email == claims.get("sub"))
+        if claims.get("uid") is not None:
+            statement = statement.where(User.id == claims["uid"])
+        return session.exec(statement).first()
+
+    def revoke(self, token: str):
+        if not token:
+            return
+        key = token_hash(token)
+        try:
+            expires_at = jwt.get_unverified_claims(token).get("exp")
+        except JWTError:
+            expires_at = None
+        now = time.time()
+        expires_at = float(expires_at) if expires_at else now + TOKEN_MAX_LIFETIME
+        with Session(engine) as session:
+            session.execute(
+                text(
+                    "INSERT OR REPLACE INTO revokedtoken (token_hash, expires_at) "
+                    "VALUES (:token_hash, :expires_at)"
+                ),
+                {"token_hash": key, "expires_at": expires_at},
+            )
+            session.execute(
+                text("DELETE FROM revokedtoken WHERE expires_at <= :now"), {"now": now}
+            )
+            session.commit()
+        with self._lock:
+            self._revoked[key] = expires_at
+        self.claims_cache.invalidate(key)
+
+    def revoke_subject(self, subject: str, session: Session | None = None):
+        """
+        Revoke every token issued so far for `subject` (a user's email). When
+        `session` is given the revocation is only added to it, so it commits
+        together with the caller's changes.
+        """
+        now = time.time()
+        statements = [
+            (
+                "INSERT OR REPLACE INTO revokedsubject "
+                "(subject, not_before, expires_at) "
+                "VALUES (:subject, :not_before, :expires_at)",
+                {
+                    "subject": subject,
+                    "not_before": now,
+                    "expires_at": now + TOKEN_MAX_LIFETIME,
+                },
+            ),
+            ("DELETE FROM revokedsubject WHERE expires_at <= :now", {"now": now}),
+        ]
+        if session is not None:
+            for statement, params in statements:
+                session.execute(text(statement), params)
+        else:
+            with Session(engine) as session:
+                for statement, params in statements:
+                    session.execute(text(statement), params)
+                session.commit()
+        with self._lock:
+            self._not_before[subject] = now
+
+
+token_validator = TokenValidator()
@@ -0,0 +1,296 @@
+import csv
+import io
+import logging
+import os
+import tempfile
+
+import orjson
+from pydantic import ValidationError
+from sqlalchemy.dialects.sqlite import insert
+from sqlmodel import Session, col, select, update
+
+import utils
+from account_pool import account_pool
+from database import engine
+from indexer import get_indexed_did
+from jobs import job_queue
+from metrics import timed
+from model import RegisterRequest, User
+from passwords import password_hasher
+
+# Rows validated, deduplicated, hashed and inserted per transaction
+IMPORT_BATCH_SIZE = int(os.getenv("CONNECTOR_IMPORT_BATCH_SIZE", "500"))
+# Row errors kept in the report, the counts always cover every row
+IMPORT_MAX_ERRORS = int(os.getenv("CONNECTOR_IMPORT_MAX_ERRORS", "1000"))
+# Uploads larger than this are buffered on disk rather than in memory
+IMPORT_SPOOL_BYTES = int(os.getenv("CONNECTOR_IMPORT_SPOOL_BYTES", str(8 << 20)))
+
+IMPORT_FORMATS = ("csv", "ndjson")
+
+logger = logging.getLogger(__name__)
+
+
+def detect_format(name: str | None) -> str:
+    """
+    Guess the input format from a file name or content type, NDJSON unless it
+    mentions csv.
+    """
+    return "csv" if name and "csv" in name.lower() else "ndjson"
+
+
+def read_rows(file, format: str):
+    """
+    Yield (row number, fields) for every record of a CSV (with a header line) or
+    NDJSON text file. Rows are numbered from 1: CSV records after the header,
+    NDJSON lines. A record that cannot be parsed yields a ValueError in place of
+    its fields so it is reported without ending the import.
+    """
+    if format == "csv":
+        for number, record in enumerate(csv.DictReader(file), 1):
+            if None in record:
+                yield number, ValueError("More fields than the header")
+                continue
+            # Empty cells count as missing, so optional fields keep their default
+            yield number, {k: v for k, v in record.items() if v not in (None, "")}
+        return
+
+    for number, line in enumerate(file, 1):
+        if not line.strip():
+            continue
+        try:
+            fields = orjson.loads(line)
+        except orjson.JSONDecodeError as e:
+            yield number, ValueError(f"Invalid JSON: {e}")
+            continue
+        if not isinstance(fields, dict):
+            yield number, ValueError("Expected a JSON object")
+            continue
+        yield number, fields
+
+
+def _validation_error(e: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}"
+        for error in e.errors()
+    )
+
+
+class UserImporter:
+    """
+    Imports users from a stream of rows in batches of `batch_size`.
+
+    Each batch is checked against the `email` column with one query before any
+    password is hashed, hashed on the password workers, and inserted with one
+    bulk statement in its own transaction. With `passwordless` (or a row's own
+    isPWLess) the batch's users also get pool accounts and register_did jobs in
+    that same transaction. A bad row is recorded in the report and skipped,
+    a failing batch fails only its own rows.
+    """
+
+    def __init__(self, passwordless: bool = False, batch_size: int = IMPORT_BATCH_SIZE):
+        self.passwordless = passwordless
+        self.batch_size = max(batch_size, 1)
+        self.rows = 0
+        self.imported = 0
+        self.duplicates = 0
+        self.failed = 0
+        self.unassigned = 0  # passwordless rows imported without an account
+        self.accounts = 0
+        self.jobs = 0
+        self.errors = []
+        self._error_count = 0
+        self._seen = {}  # email -> row number, for duplicates within the input
+
+    def error(self, row: int, email: str | None, message: str, counter="failed"):
+        setattr(self, counter, getattr(self, counter) + 1)
+        self._error_count += 1
+        if len(self.errors) < IMPORT_MAX_ERRORS:
+            self.errors.append({"row": row, "email": email, "error": message})
+
+    def report(self):
+        return {
+            "rows": self.rows,
+            "imported": self.imported,
+            "duplicates": self.duplicates,
+            "failed": self.failed,
+            "unassigned": self.unassigned,
+            "passwordless": self.accounts,
+            "jobs": self.jobs,
+            "errors": self.errors,
+            "errors_truncated": self._error_count > len(self.errors),
+        }
+
+    def run(self, rows):
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                self.import_batch(batch)
+                batch = []
+        if batch:
+            self.import_batch(batch)
+        logger.info(
+            "Imported %d of %d users (%d duplicates, %d failed, %d jobs)",
+            self.imported,
+            self.rows,
+            self.duplicates,
+            self.failed,
+            self.jobs,
+        )
+        return self.report()
+
+    def _validate(self, batch):
+        valid = []
+        for number, fields in batch:
+            self.rows += 1
+            if isinstance(fields, Exception):
+                self.error(number, None, str(fields))
+                continue
+            email = fields.get("email")
+            try:
+                request = RegisterRequest.model_validate(fields)
+            except ValidationError as e:
+                self.error(number, email, _validation_error(e))
+                continue
+            request.email = request.email.strip()
+            first = self._seen.setdefault(request.email, number)
+            if first != number:
+                self.error(
+                    number, request.email, f"Duplicate of row {first}", "duplicates"
+                )
+                continue
+            valid.append((number, request))
+        return valid
+
+    def import_batch(self, batch):
+        with timed("user_import_batch"):
+            valid = self._validate(batch)
+            if not valid:
+                return
+            with Session(engine) as session:
+                existing = set(
+                    session.exec(
+                        select(User.email).where(
+                            col(User.email).in_([r.email for _, r in valid])
+                        )
+                    ).all()
+                )
+            pending = []
+            for number, request in valid:
+                if request.email in existing:
+                    self.error(
+                        number, request.email, "User already exists.", "duplicates"
+                    )
+                else:
+                    pending.append((number, request))
+            if not pending:
+                return
+
+            hashes = password_hasher.hash_many([r.password for _, r in pending])
+            try:
+                self._insert(pending, hashes)
+            except Exception as e:
+                logger.error("Import batch of %d users failed: %s", len(pending), e)
+                for number, request in pending:
+                    self.error(number, request.email, f"Batch failed: {e}")
+
+    def _insert(self, pending, hashes):
+        values = [
+            {
+                "username": request.username,
+                "email": request.email,
+                "phone": request.phone,
+                "password_hash": password_hash,
+                "role": request.role,
+                "isPWLess": False,
+                "isOnline": False,
+            }
+            for (_, request), password_hash in zip(pending, hashes)
+        ]
+        with Session(engine) as session:
+            # Rows another writer inserted since the check are skipped rather
+            # than failing the whole statement
+            inserted = session.execute(
+                insert(User)
+                .on_conflict_do_nothing(index_elements=["email"])
+                .returning(User.id, User.email),
+                values,
+            ).all()
+            ids = {email: user_id for user_id, email in inserted}
+
+            wanted = {
+                ids[request.email]: None
+                for _, request in pending
+                if request.email in ids and (self.passwordless or request.isPWLess)
+            }
+            # The insert above took the write lock, so the claim cannot race
+            claimed = account_pool.allocate_many(session, list(wanted))
+            updates, payloads = [], []
+            for user_id, account in claimed.items():
+                address, public_key = account_pool.keys(account)
+                did = utils.make_did(address)
+                updates.append(
+                    {
+                        "id": user_id,
+                        "isPWLess": True,
+                        "blockchain_address": address,
+                        "private_key": account.private_key,
+                        "public_key": public_key,
+                        "did": did,
+                    }
+                )
+                # An account's DID stays registered after it is released, so
+                # only queue the ones not already known to be on-chain
+                known = utils.did_cache.get(address.lower()) is not None
+                if not known and get_indexed_did(session, address) is None:
+                    payloads.append({"address": address, "did": did})
+            if updates:
+                session.execute(update(User), updates)
+            if payloads:
+                job_queue.enqueue_many("register_did", payloads, session=session)
+            session.commit()
+
+        if payloads:
+            job_queue.notify()
+        self.imported += len(ids)
+        self.accounts += len(claimed)
+        self.jobs += len(payloads)
+        for number, request in pending:
+            user_id = ids.get(request.email)
+            if user_id is None:
+                self.error(number, request.email, "User already exists.", "duplicates")
+            elif user_id in wanted and user_id not in claimed:
+                self.error(
+                    number,
+                    request.email,
+                    "No available accounts, imported without passwordless.",
+                    "unassigned",
+                )
+
+
+def import_users(
+    file,
+    format: str,
+    passwordless: bool = False,
+    batch_size: int = IMPORT_BATCH_SIZE,
+):
+    """
+    Import every user of a CSV or NDJSON text file and return the report.
+    """
+    if format not in IMPORT_FORMATS:
+        raise ValueError(f"Unknown import format: {format}")
+    importer = UserImporter(passwordless=passwordless, batch_size=batch_size)
+    return importer.run(read_rows(file, format))
+
+
+async def spool_upload(chunks):
+    """
+    Buffer a streamed request body (in memory up to IMPORT_SPOOL_BYTES, then on
+    disk) and return it as a text file for import_users.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_BYTES)
+    async for chunk in chunks:
+        spool.write(chunk)
+    spool.seek(0)
+    # utf-8-sig drops the byte order mark spreadsheet exports start with
+    return io.TextIOWrapper(spool, encoding="utf-8-sig", newline="")
@@ -0,0 +1,201 @@
+import asyncio
+import base64
+import binascii
+import os
+
+import orjson
+from sqlmodel import Session, func, select
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+
+import database
+from async_chain import resolve_dids_batch
+from model import User
+
+USERS_PAGE_SIZE = int(os.getenv("CONNECTOR_USERS_PAGE_SIZE", "100"))
+USERS_MAX_PAGE_SIZE = int(os.getenv("CONNECTOR_USERS_MAX_PAGE_SIZE", "1000"))
+# Rows fetched from the cursor per chunk when streaming
+USERS_STREAM_CHUNK = int(os.getenv("CONNECTOR_USERS_STREAM_CHUNK", "500"))
+# Rows per chunk of the DID export, each chunk's DIDs are resolved together
+USERS_EXPORT_CHUNK = int(os.getenv("CONNECTOR_USERS_EXPORT_CHUNK", "200"))
+
+# Credentials never leave the API through the listing, whatever `fields` asks for
+PRIVATE_FIELDS = {"password_hash", "private_key", "access_token"}
+USER_FIELDS = list(User.__table__.columns.keys())
+PUBLIC_FIELDS = [name for name in USER_FIELDS if name not in PRIVATE_FIELDS]
+
+
+def parse_fields(fields: str | None) -> list:
+    """
+    Turn a comma separated `fields` parameter into the columns to select. The id
+    is always included since it is the pagination key. Raises ValueError for
+    unknown or private fields.
+    """
+    if not fields:
+        return PUBLIC_FIELDS
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    invalid = [name for name in names if name not in PUBLIC_FIELDS]
+    if invalid:
+        raise ValueError(f"Unknown or private fields: {', '.join(invalid)}")
+    return ["id"] + [name for name in dict.fromkeys(names) if name != "id"]
+
+
+def users_statement(fields: list, cursor: int | None = None):
+    # Keyset pagination: seek past the last id instead of OFFSET, so every page
+    # is an index range scan on the primary key
+    statement = select(*(getattr(User, name) for name in fields)).order_by(User.id)
+    if cursor is not None:
+        statement = statement.where(User.id > cursor)
+    return statement
+
+
+def list_users(session: Session, fields: list, cursor: int | None, limit: int):
+    """
+    One page of users as dicts, plus the cursor of the next page (None on the
+    last page).
+    """
+    rows = session.exec(users_statement(fields, cursor).limit(limit)).all()
+    users = [dict(row._mapping) for row in rows]
+    next_cursor = users[-1]["id"] if len(users) == limit else None
+    return users, next_cursor
+
+
+def _ndjson(rows) -> bytes:
+    return b"".join(orjson.dumps(dict(row._mapping)) + b"\n" for row in rows)
+
+
+def stream_users(fields: list, cursor: int | None = None):
+    """
+    Yield users as NDJSON chunks straight from the database cursor, one chunk
+    per USERS_STREAM_CHUNK rows, so memory use does not grow with the table.
+    """
+    statement = users_statement(fields, cursor).execution_options(
+        yield_per=USERS_STREAM_CHUNK
+    )
+    if database.async_engine is not None:
+        return _stream_users_async(statement)
+    return _stream_users_sync(statement)
+
+
+def _stream_users_sync(statement):
+    # Starlette iterates sync generators in its threadpool
+    with database.engine.connect() as connection:
+        for rows in connection.execute(statement).partitions():
+            yield _ndjson(rows)
+
+
+async def _stream_users_async(statement):
+    async with database.async_engine.connect() as connection:
+        result = await connection.stream(statement)
+        async for rows in result.partitions():
+            yield _ndjson(rows)
+
+
+# Export of users with their on-chain DID
+
+
+def encode_export_cursor(after: int, until: int) -> str:
+    return base64.urlsafe_b64encode(f"{after}:{until}".encode()).decode().rstrip("=")
+
+
+def decode_export_cursor(token: str):
+    """
+    Return (after, until) from a token written by encode_export_cursor. Raises
+    ValueError if it is not one.
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        after, until = base64.urlsafe_b64decode(padded).decode().split(":")
+        return int(after), int(until)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("Invalid export cursor")
+
+
+def export_bounds(session: Session, token: str | None = None):
+    """
+    The id range (after, until] an export covers. A new export ends at the
+    highest id present when it starts, so a resumed one (from the `cursor` of
+    the last line received) covers the same users however the table changed.
+    """
+    if token:
+        return decode_export_cursor(token)
+    return 0, session.exec(select(func.max(User.id))).one() or 0
+
+
+def _partitions_sync(statement):
+    with database.engine.connect() as connection:
+        yield from connection.execute(statement).partitions()
+
+
+async def _partitions(statement):
+    if database.async_engine is not None:
+        async with database.async_engine.connect() as connection:
+            result = await connection.stream(statement)
+            async for rows in result.partitions():
+                yield rows
+        return
+
+    partitions = _partitions_sync(statement)
+    try:
+        async for rows in iterate_in_threadpool(partitions):
+            yield rows
+    finally:
+        # Return the connection now if the client went away mid-export
+        await run_in_threadpool(partitions.close)
+
+
+async def _resolve_chain_dids(rows) -> dict:
+    addresses = list(
+        dict.fromkeys(row.blockchain_address for row in rows if row.blockchain_address)
+    )
+    if not addresses:
+        return {}
+    try:
+        results = await resolve_dids_batch(addresses)
+    except Exception as e:
+        # e.g. no contract deployment; the users are still exported
+        return {address: {"did": None, "error": str(e)} for address in addresses}
+    return {r["address"]: {"did": r["did"], "error": r["error"]} for r in results}
+
+
+def _export_lines(rows, chain: dict, until: int) -> bytes:
+    return b"".join(
+        orjson.dumps(
+            {
+                **row._mapping,
+                "chain": chain.get(row.blockchain_address),
+                "cursor": encode_export_cursor(row.id, until),
+            }
+        )
+        + b"\n"
+        for row in rows
+    )
+
+
+async def export_users(after: int, until: int):
+    """
+    Yield every user with id in (after, until] as NDJSON, without credentials,
+    each line carrying `chain` (the DID the registry holds for the user's
+    address, or the error resolving it; null without an address) and the
+    `cursor` that resumes the export after that line.
+
+    Rows come from the database cursor USERS_EXPORT_CHUNK at a time. The DIDs
+    of a chunk are resolved with resolve_dids_batch, so with bounded
+    concurrency, while the next chunk is read; at most two chunks are held.
+    """
+    statement = (
+        users_statement(PUBLIC_FIELDS, after)
+        .where(User.id <= until)
+        .execution_options(yield_per=USERS_EXPORT_CHUNK)
+    )
+    pending = None  # (rows, task resolving their DIDs)
+    try:
+        async for rows in _partitions(statement):
+            task = asyncio.ensure_future(_resolve_chain_dids(rows))
+            if pending:
+                yield _export_lines(pending[0], await pending[1], until)
+            pending = (rows, task)
+        if pending:
+            yield _export_lines(pending[0], await pending[1], until)
+    finally:
+        if pending:
+            pending[1].cancel()
@@ -1,69 +1,187 @@
 import base64
+import hashlib
 import json
+import logging
 import os
+import threading
+import time
+from typing import TYPE_CHECKING
 
-import web3
-from cryptography.hazmat.primitives import hashes, serialization
-from cryptography.hazmat.primitives.asymmetric import padding, rsa
-from eth_keys import keys
-from eth_utils import decode_hex
-from web3 import Web3
-
+from cache import TTLCache
+from metrics import register_abi, rpc_metrics_middleware
 from model import User
 
+# web3 (with eth_account, ens and py_ecc) takes over a second to import, so it is
+# imported on first use instead of when the app loads
+if TYPE_CHECKING:
+    from web3 import Web3
+
+logger = logging.getLogger(__name__)
+
 SECRET_KEY = "SomeVerySecretKeyHena"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30  # Token expiry time
-# Web3 setup
-w3 = Web3(Web3.HTTPProvider("http://127.0.0.1:8545"))  # Adjust the provider as needed
+
+# Blockchain settings (override with environment variables)
+RPC_URL = os.getenv("CONNECTOR_RPC_URL", "http://127.0.0.1:8545")  # Hardhat testnet
+DEPLOYMENT_DIR = os.getenv(
+    "CONNECTOR_DEPLOYMENT_DIR",
+    os.path.join(
+        os.path.dirname(os.path.abspath(__file__)),
+        "..",
+        "Blockchain",
+        "ignition",
+        "deployments",
+        "chain-31337",
+    ),
+)
+CONTRACT_ID = "DIDRegistryModule#DIDRegistry"
+RPC_POOL_SIZE = int(os.getenv("CONNECTOR_RPC_POOL_SIZE", "20"))
+# Seconds before a single JSON-RPC request is abandoned
+RPC_TIMEOUT = float(os.getenv("CONNECTOR_RPC_TIMEOUT", "10"))
+# Seconds between checks of the deployment files for a redeploy
+CONTRACT_CHECK_INTERVAL = float(os.getenv("CONNECTOR_CONTRACT_CHECK_INTERVAL", "2"))
+# DID resolution cache
+DID_CACHE_SIZE = int(os.getenv("CONNECTOR_DID_CACHE_SIZE", "4096"))
+DID_CACHE_TTL = float(os.getenv("CONNECTOR_DID_CACHE_TTL", "300"))
+# Seconds between polls for DIDRegistered logs (0 disables the subscriber)
+DID_EVENT_POLL_INTERVAL = float(os.getenv("CONNECTOR_DID_EVENT_POLL_INTERVAL", "2"))
+
+
+def make_http_provider(endpoint_uri: str = RPC_URL) -> "Web3.HTTPProvider":
+    """
+    Build an HTTP provider backed by a pooled keep-alive session.
+    """
+    import requests
+    from web3 import Web3
+
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=RPC_POOL_SIZE, pool_maxsize=RPC_POOL_SIZE
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return Web3.HTTPProvider(
+        endpoint_uri, request_kwargs={"timeout": RPC_TIMEOUT}, session=session
+    )
+
+
+_w3 = None
+_w3_lock = threading.Lock()
+
+
+def get_w3() -> "Web3":
+    """
+    The Web3 instance shared by every sync chain call, built on first use.
+    """
+    global _w3
+    if _w3 is None:
+        with _w3_lock:
+            if _w3 is None:
+                from web3 import Web3
+
+                web3 = Web3(make_http_provider())
+                web3.middleware_onion.add(rpc_metrics_middleware, "metrics")
+                _w3 = web3
+    return _w3
+
+
+def __getattr__(name):
+    # `utils.w3` still works, it just builds the instance on first access
+    if name == "w3":
+        return get_w3()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Resolved DIDs keyed by lowercase address
+did_cache = TTLCache(maxsize=DID_CACHE_SIZE, ttl=DID_CACHE_TTL)
+
+
+def make_did(address: str) -> str:
+    """
+    Build the did:key identifier registered for an address.
+    """
+    return f"did:key:{address[2:]}"
+
+
+def submit_revoke_did(address: str):
+    """
+    Send the revokeDID transaction and return its hash without waiting for it.
+    """
+    contract = initialize_contract()
+    return contract.functions.revokeDID(address).transact({"from": address})
+
 
 def revoke_did(address: str):
     """
     Revoke a DID on the blockchain with the given address.
     """
-    contract = initialize_contract()
-    tx = contract.functions.revokeDID(address).transact({"from": address})
-    receipt = w3.eth.wait_for_transaction_receipt(tx)
+    tx = submit_revoke_did(address)
+    receipt = get_w3().eth.wait_for_transaction_receipt(tx)
+    did_cache.invalidate(address.lower())
     return receipt
 
+
+def submit_register_did(address: str, did: str):
+    """
+    Send the registerDID transaction and return its hash without waiting for it.
+    """
+    contract = initialize_contract()
+    return contract.functions.registerDID(address, did).transact({"from": address})
+
+
 def register_did(address: str, did: str):
     """
     Register a DID on the blockchain with the given address and public key.
     """
-    contract = initialize_contract()
-    tx = contract.functions.registerDID(address, did).transact({"from": address})
-    receipt = w3.eth.wait_for_transaction_receipt(tx)
+    tx = submit_register_did(address, did)
+    receipt = get_w3().eth.wait_for_transaction_receipt(tx)
+    did_cache.invalidate(address.lower())
     return receipt
 
 
 def get_did(address: str):
     """
-    Get the DID for a given address from the contract.
+    Get the DID for a given address, served from the DID cache when possible.
+    Raises ContractLogicError if the address has no DID.
     """
+    did = did_cache.get(address.lower())
+    if did is not None:
+        return did
+
     contract = initialize_contract()  # Ensure your contract is initialized
-    print(f"[GET_DID] Address: {address}")
+    logger.debug("Resolving DID of %s", address)
 
     # Directly call the `getDID` function, no need for tx receipt
     did = contract.functions.getDID(address).call()
 
-    # Print or log the DID for debugging
-    print(f"[GET_DID] Retrieved DID from blockchain: {did}")
+    logger.debug("Retrieved DID from blockchain: %s", did)
+    did_cache.set(address.lower(), did)
 
     # Return the DID string (it should already be in the correct format)
     return did
 
 
+def submit_issue_vc(issuer: str, holder: str, credential_hash: str):
+    """
+    Send the issueVC transaction and return its hash without waiting for it.
+    """
+    contract = initialize_contract()
+    return contract.functions.issueVC(holder, credential_hash).transact(
+        {"from": issuer}
+    )
+
+
 def issue_vc(issuer: str, holder: str, credential_hash: str):
     """
     Issue a Verifiable Credential (VC) on the blockchain.
     """
-    contract = initialize_contract()
-    tx = contract.functions.issueVC(holder, credential_hash).transact({"from": issuer})
-    receipt = w3.eth.wait_for_transaction_receipt(tx)
+    tx = submit_issue_vc(issuer, holder, credential_hash)
+    receipt = get_w3().eth.wait_for_transaction_receipt(tx)
     return receipt
 
 
-def verify_signature(message: str, signature: str, address: str, w3: Web3) -> bool:
+def verify_signature(message: str, signature: str, address: str, w3: "Web3") -> bool:
     """
     Verifies the signature of a message using the Ethereum address.
     """
@@ -79,7 +197,7 @@ def verify_signature(message: str, signature: str, address: str, w3: Web3) -> bo
         # Compare recovered address with the given address
         return recovered_address.lower() == address.lower()
     except Exception as e:
-        print(f"Error in verifying signature: {e}")
+        logger.debug("Error in verifying signature: %s", e)
         return False
 
 
@@ -90,6 +208,7 @@ def generate_challenge():
 
 
 def verify_challenge(user_address, challenge, signed_challenge):
+    w3 = get_w3()
     # Recompute the challenge hash
     challenge_hash = w3.solidityKeccak(["string"], [challenge])
 
@@ -100,14 +219,15 @@ def verify_challenge(user_address, challenge, signed_challenge):
 
     # Verify that the recovered address matches the user's address (DID owner)
     if recovered_address.lower() == user_address.lower():
-        print("Authentication successful!")
+        logger.info("Authentication successful!")
         return True
     else:
-        print("Authentication failed!")
+        logger.info("Authentication failed!")
         return False
 
 
 def sign_challenge(challenge, private_key):
+    w3 = get_w3()
     # Hash the challenge
     challenge_hash = w3.solidityKeccak(["string"], [challenge])
 
@@ -120,6 +240,9 @@ def sign_message(message: str, private_key: str):
     """
     Signs a message with the provided private key.
     """
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import padding
+
     try:
         private_key_bytes = base64.b64decode(
             private_key
@@ -135,7 +258,7 @@ def sign_message(message: str, private_key: str):
         # Return the signature as hex
         return signature.hex()
     except Exception as e:
-        print(f"Error in signing message: {e}")
+        logger.error("Error in signing message: %s", e)
         return None
 
 
@@ -143,6 +266,9 @@ def generate_private_key():
     """
     Generate a private key using RSA algorithm (for testing purposes).
     """
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
     private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
     private_pem = private_key.private_bytes(
         encoding=serialization.Encoding.PEM,
@@ -160,39 +286,38 @@ def generate_public_key(private_key_pem: bytes, isPEM: bool, isBase64: bool):
     Also verify the public key by signing a message with the private key and verifying it with the public key.
     use eth_keys to generate a new public key from the private key.
     """
+    from cryptography.hazmat.primitives import serialization
+    from eth_keys import keys
+    from eth_utils import decode_hex
+
     try:
         # Load the private key
         if isPEM:
-            print(f"I am in PEM")
             private_key = serialization.load_pem_private_key(
                 private_key_pem, password=None
             )
-            print(f"PEM'ed private key: {private_key}")
         elif isBase64:
-            print(f"I am in B64")
             private_key = serialization.load_pem_private_key(
                 base64.b64decode(private_key_pem), password=None
             )
-            print(f"Base64'ed private key: {private_key}")
         else:
-            print(f"I am in HEX")
             private_key = private_key_pem
 
         privateKeyBytes = decode_hex(private_key)
         privateKey = keys.PrivateKey(privateKeyBytes)
         public_key = privateKey.public_key
-        print(f"Public key: {public_key}")
-
-        print(f"CONFRIM Address: {public_key.to_checksum_address()}")
+        logger.debug("Generated public key of %s", public_key.to_checksum_address())
 
         return str(public_key)
     except Exception as e:
-        print(f"Error in generating public key: {e}")
+        logger.error("Error in generating public key: %s", e)
         return None
 
 
 # Utility Functions
-def verify_signature(message: str, signature: str, address: str, w3Prov: Web3) -> bool:
+def verify_signature(
+    message: str, signature: str, address: str, w3Prov: "Web3"
+) -> bool:
     """
     Verifies that a given signature is valid for a given message and address.
 
@@ -204,26 +329,20 @@ def verify_signature(message: str, signature: str, address: str, w3Prov: Web3) -
     Returns:
         bool: True if the signature is valid and matches the address, False otherwise.
     """
+    import web3
+
     message_hash = web3.solidityKeccak(["string"], [message])
     signer = web3.eth.account.recoverHash(message_hash, signature=signature)
     return signer.lower() == address.lower()
 
 
 # Load the deployment information
-def getContract():
-    debug = False
-    # Define the base directory (prefix path)
-    base_dir = r"..\blockchain\ignition\deployments\chain-31337"
-
+def getContract(base_dir: str = DEPLOYMENT_DIR):
     # Construct the paths to the ABI and address JSON files by prefixing the base directory
-    abi_json_path = os.path.join(
-        base_dir, "artifacts", "DIDRegistryModule#DIDRegistry.json"
-    )
-    address_json_path = os.path.join(base_dir, "deployed_addresses.json")
+    abi_json_path, address_json_path = get_deployment_paths(base_dir)
 
-    print(f"Loading contract details...")
-    print(f"  ABI Path: {abi_json_path}")
-    print(f"  Address Path: {address_json_path}")
+    logger.info("Loading contract details from %s", abi_json_path)
+    logger.debug("Address path: %s", address_json_path)
 
     # Load the ABI and contract address in one go
     with open(abi_json_path, "r") as abi_file:
@@ -234,72 +353,234 @@ def getContract():
 
     # Extract contract ABI and address
     contract_abi = contract_data["abi"]
-    contract_address = deployed_addresses.get("DIDRegistryModule#DIDRegistry", "")
+    contract_address = deployed_addresses.get(CONTRACT_ID, "")
 
-    # Print contract address
-    print(f"  Contract Address: {contract_address}\n")
+    logger.info("Contract address: %s", contract_address)
 
-    # Loop through the ABI and print details for each function
-    if debug:
+    # Loop through the ABI and log details for each function
+    if logger.isEnabledFor(logging.DEBUG):
         for item in contract_abi:
-            # Only print function details, skip events
+            # Only log function details, skip events
             if item["type"] == "function":
-                print(f"Function Name: {item['name']}")
-
-                # Print function inputs
-                if item["inputs"]:
-                    print("  Inputs:")
-                    for input_param in item["inputs"]:
-                        print(
-                            f"    - Name: {input_param['name']}({input_param['type']})"
-                        )
-                else:
-                    print("  Inputs: None")
-
-                # Print function outputs
-                if item["outputs"]:
-                    print("  Outputs:")
-                    for output_param in item["outputs"]:
-                        print(
-                            f"    - Name: {output_param['name']}({output_param['type']})"
-                        )
-                else:
-                    print("  Outputs: None")
-
-                print("-" * 50)
+                logger.debug(
+                    "Function %s(%s) -> (%s)",
+                    item["name"],
+                    ", ".join(f"{p['type']} {p['name']}" for p in item["inputs"]),
+                    ", ".join(f"{p['type']} {p['name']}" for p in item["outputs"]),
+                )
 
     # Return both the contract address and ABI for further use
     return contract_address, contract_abi
 
 
-# Initialize Web3 and the contract
+def get_deployment_paths(base_dir: str = DEPLOYMENT_DIR):
+    """
+    Return the paths of the ABI artifact and the deployed addresses file.
+    """
+    abi_json_path = os.path.join(base_dir, "artifacts", f"{CONTRACT_ID}.json")
+    address_json_path = os.path.join(base_dir, "deployed_addresses.json")
+    return abi_json_path, address_json_path
+
+
+class ContractRegistry:
+    """
+    Process-wide cache of the DIDRegistry contract handle.
+
+    The ABI and address are loaded from the ignition deployment once and shared by
+    every caller. The files are re-checked at most every `check_interval` seconds
+    (mtime/size first, then a content hash) and the contract is only rebuilt when a
+    redeploy actually changed them.
+    """
+
+    def __init__(
+        self,
+        web3: "Web3" = None,
+        base_dir: str = DEPLOYMENT_DIR,
+        check_interval: float = CONTRACT_CHECK_INTERVAL,
+    ):
+        self.web3 = web3
+        self.base_dir = base_dir
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._contract = None
+        self._stat = None
+        self._digest = None
+        self._checked_at = 0.0
+        self._reload_listeners = []
+
+    def _w3(self):
+        return self.web3 or get_w3()
+
+    def add_reload_listener(self, callback):
+        """
+        Register a callable invoked whenever a changed deployment is loaded.
+        """
+        self._reload_listeners.append(callback)
+
+    def _stat_files(self):
+        stats = []
+        for path in get_deployment_paths(self.base_dir):
+            st = os.stat(path)
+            stats.append((st.st_mtime_ns, st.st_size))
+        return tuple(stats)
+
+    def _hash_files(self):
+        digest = hashlib.sha256()
+        for path in get_deployment_paths(self.base_dir):
+            with open(path, "rb") as file:
+                digest.update(file.read())
+        return digest.hexdigest()
+
+    def _load(self, stat, digest):
+        contract_address, contract_abi = getContract(self.base_dir)
+        register_abi(contract_abi)
+        self._contract = self._w3().eth.contract(
+            address=contract_address, abi=contract_abi
+        )
+        self._stat = stat
+        self._digest = digest
+
+    def get(self):
+        """
+        Return the cached contract, reloading it if the deployment files changed.
+        """
+        now = time.monotonic()
+        contract = self._contract
+        if contract is not None and now - self._checked_at < self.check_interval:
+            return contract
+
+        with self._lock:
+            if (
+                self._contract is not None
+                and now - self._checked_at < self.check_interval
+            ):
+                return self._contract
+            stat = self._stat_files()
+            if self._contract is None:
+                self._load(stat, self._hash_files())
+            elif stat != self._stat:
+                digest = self._hash_files()
+                if digest != self._digest:
+                    logger.info("Deployment changed, reloading contract")
+                    self._load(stat, digest)
+                    for callback in self._reload_listeners:
+                        callback()
+                else:
+                    self._stat = stat
+            self._checked_at = time.monotonic()
+            return self._contract
+
+    def refresh(self):
+        """
+        Force the contract to be reloaded from disk on the next call.
+        """
+        with self._lock:
+            self._contract = None
+            self._stat = None
+            self._digest = None
+            self._checked_at = 0.0
+        for callback in self._reload_listeners:
+            callback()
+
+
+contract_registry = ContractRegistry()
+# DIDs resolved against an old deployment are meaningless after a reload
+contract_registry.add_reload_listener(did_cache.clear)
+
+
+# Get the shared contract handle
 def initialize_contract():
-    w3 = Web3(Web3.HTTPProvider("http://localhost:8545"))
-    # contract_address, contract_abi = spawnContract()
-    contract_address, contract_abi = getContract()
+    return contract_registry.get()
+
 
-    return w3.eth.contract(address=contract_address, abi=contract_abi)
+# Force a reload of the contract (e.g. after redeploying with ignition)
+def refresh_contract():
+    # Imported here since async_chain imports this module
+    from async_chain import async_contract_registry
 
+    contract_registry.refresh()
+    async_contract_registry.refresh()
 
-# Print the user object
+
+class DIDEventSubscriber:
+    """
+    Background thread that follows DIDRegistered logs and evicts the affected
+    addresses from the DID cache, so DIDs registered by other clients show up
+    without waiting for the TTL.
+    """
+
+    def __init__(self, cache: TTLCache, poll_interval: float = DID_EVENT_POLL_INTERVAL):
+        self.cache = cache
+        self.poll_interval = poll_interval
+        self._last_block = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def poll_once(self):
+        """
+        Fetch DIDRegistered logs since the last poll and invalidate their addresses.
+        Returns the number of invalidated entries.
+        """
+        latest = get_w3().eth.block_number
+        if self._last_block is None:
+            self._last_block = latest
+            return 0
+        if latest <= self._last_block:
+            return 0
+
+        contract = initialize_contract()
+        logs = contract.events.DIDRegistered.get_logs(
+            fromBlock=self._last_block + 1, toBlock=latest
+        )
+        for log in logs:
+            self.cache.invalidate(log["args"]["user"].lower())
+        self._last_block = latest
+        return len(logs)
+
+    def _run(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.poll_once()
+            except Exception as e:
+                logger.error("Error polling DID logs: %s", e)
+
+    def start(self):
+        if self.poll_interval <= 0 or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="did-event-subscriber", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.poll_interval + 1)
+            self._thread = None
+
+
+did_event_subscriber = DIDEventSubscriber(did_cache)
+
+
+# Log the user object, credentials left out
 def print_user(user: User):
-    print(f"User {user.username} ({user.email})")
-    # print(f"  ID: {user.id}")
-    print(f"  Phone Number: {user.phone}")
-    print(f"  Role: {user.role}")
-    print(f"  DID: {user.did}")
-    print(f"  Is Passwordless: {user.isPWLess}")
-    if user.isPWLess:
-        print(f"  Public Key: {user.public_key}")
-        print(f"  Private Key: {user.private_key}")
-        print(f"  Blockchain Address: {user.blockchain_address}")
-    print(f"  Is Online: {user.isOnline}")
-    print()
+    logger.debug(
+        "User %s (%s) phone=%s role=%s did=%s isPWLess=%s address=%s isOnline=%s",
+        user.username,
+        user.email,
+        user.phone,
+        user.role,
+        user.did,
+        user.isPWLess,
+        user.blockchain_address if user.isPWLess else None,
+        user.isOnline,
+    )
 
 
 # Get all accounts from hardhat testnet
 def get_loaded_accounts():
-    return w3.eth.accounts
+    return get_w3().eth.accounts
 
 
 # Parse accounts.json and return a list of w3 accounts
@@ -7,7 +7,7 @@ import {
   Menu,
   User,
 } from "lucide-react";
-import React, { useState } from "react";
+import React, { useEffect, useState } from "react";
 import { Link, useLocation } from "react-router-dom";
 import logo from "../assets/logo.jpg";
 
@@ -15,6 +15,19 @@ const Sidebar = ({ role, children }) => {
   const location = useLocation();
   const [isExpanded, setIsExpanded] = useState(false);
 
+  // Keep the user marked online while a page is open
+  useEffect(() => {
+    const sendHeartbeat = () =>
+      fetch("http://127.0.0.1:8000/api/presence/heartbeat", {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ token: localStorage.getItem("access_token") }),
+      }).catch((error) => console.error("Heartbeat failed:", error));
+    sendHeartbeat();
+    const interval = setInterval(sendHeartbeat, 30000);
+    return () => clearInterval(interval);
+  }, []);
+
   const adminLinks = [
     { name: "Users", path: "/admin/dashboard", icon: <ChartArea /> },
     { name: "Profile", path: "/admin/profile", icon: <User /> },
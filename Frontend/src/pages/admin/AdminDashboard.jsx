@@ -47,15 +47,28 @@ const Dashboard = () => {
       navigate("/");
     }
   };
+  // /api/users is paginated, follow the cursor until the last page
+  const fetchAllUsers = async () => {
+    let all = [];
+    let cursor = null;
+    do {
+      const url = new URL("http://localhost:8000/api/users");
+      url.searchParams.set("limit", "1000");
+      if (cursor) url.searchParams.set("cursor", cursor);
+      const res = await fetch(url);
+      all = all.concat(await res.json());
+      cursor = res.headers.get("X-Next-Cursor");
+    } while (cursor);
+    return all;
+  };
+
   useEffect(() => {
     verifyJWT();
 
-    fetch("http://localhost:8000/api/users")
-      .then((res) => res.json())
-      .then((data) => {
-        setUsers(data);
-        setTotalUsers(data.length);
-      });
+    fetchAllUsers().then((data) => {
+      setUsers(data);
+      setTotalUsers(data.length);
+    });
 
     fetch("http://localhost:8000/api/users/active")
       .then((res) => res.json())
@@ -66,12 +79,10 @@ const Dashboard = () => {
     fetch(`http://localhost:8000/api/users/${id}`, { method: "DELETE" })
       .then((res) => res.json())
       .then(() => {
-        fetch("http://localhost:8000/api/users")
-          .then((res) => res.json())
-          .then((data) => {
-            setUsers(data);
-            setTotalUsers(data.length);
-          });
+        fetchAllUsers().then((data) => {
+          setUsers(data);
+          setTotalUsers(data.length);
+        });
       });
   };
 